@@ -0,0 +1,135 @@
+# Historical backfill - pulls the full Dashboard and Sales Report history in chunked range reads,
+# parses it with the same code as the dashboard (dashboard_data.parse_data) and writes Parquet files
+# under history/<plant>/. An interrupted run picks up after the last completed chunk, and a finished one
+# re-reads from where its shortest column block ended, so rows added since are fetched.
+#   python backfill.py [--plant main] [--chunk-rows 5000] [--credentials sa.json] [--restart]
+import argparse
+import json
+import shutil
+import time
+from pathlib import Path
+
+from dashboard_data import authorize, load_creds_info, parse_data, raw_version, read_plants
+from dashboard_quota import API_CALLS
+
+APP_DIR = Path(__file__).parent
+HISTORY_DIR = APP_DIR / "history"
+PLANTS_CONFIG = APP_DIR / "plants.toml"
+# Column blocks that grow independently - the Sales Report's A-C, K-L and Q-S lists share rows but not lengths
+SHEET_BLOCKS = {"dashboard": [slice(None)], "sales_report": [slice(0, 3), slice(10, 12), slice(16, 19)]}
+
+def write_json_atomic(path, payload):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(payload))
+    tmp.replace(path)
+
+# Chunks are written before the checkpoint moves past them, so a crash costs at most one chunk; the checkpoint
+# keeps each chunk's row count, so chunk files past it are simply overwritten.
+# Sheets drops trailing blank rows, so blank rows are carried (entry["blank"]) until a later chunk has data
+# and are then written in front of it, keeping every row in place. block_end holds the last row with data in
+# each column block; a finished sheet is re-read from the row after the shortest block, so rows appended to
+# any block (or the sheet growing) are picked up by the next run.
+def fetch_chunks(ws, name, plant_dir, state, chunk_rows):
+    blocks = SHEET_BLOCKS[name]
+    if "lengths" not in state.get(name, {}):
+        # Checkpoints without per-chunk lengths or block ends are started over
+        state[name] = {"next_row": 1, "lengths": [], "blank": 0, "block_end": [0] * len(blocks), "done": False}
+    entry = state[name]
+    total_rows = ws.row_count
+    if entry["done"]:
+        rewind(entry, min(entry["block_end"]) + 1)
+        entry["done"] = entry["next_row"] > total_rows
+    while not entry["done"]:
+        start = entry["next_row"]
+        end = min(start + chunk_rows - 1, total_rows)
+        with API_CALLS.call("values.get", f"{ws.title}!{start}:{end}", "backfill"):
+            rows = ws.get_values(f"{start}:{end}")
+        blank = entry["blank"]
+        if rows:
+            chunk = [[] for _ in range(blank)] + rows
+            write_json_atomic(plant_dir / "raw" / f"{name}_{len(entry['lengths']):05d}.json", chunk)
+            entry["lengths"].append(len(chunk))
+            first = start - blank
+            for i, row in enumerate(chunk):
+                for b, cols in enumerate(blocks):
+                    if any(row[cols]):
+                        entry["block_end"][b] = first + i
+            blank = 0
+        blank += end - start + 1 - len(rows)
+        entry["done"] = end >= total_rows
+        entry["next_row"], entry["blank"] = (end + 1 - blank, 0) if entry["done"] else (end + 1, blank)
+        write_json_atomic(plant_dir / "state.json", state)
+        print(f"{name}: rows {start}-{end} of {total_rows} ({len(rows)} returned)")
+
+# Moves the checkpoint back to sheet row `row` - chunks are cut to the rows before it
+def rewind(entry, row):
+    if row >= entry["next_row"]:
+        return
+    lengths, first = [], 1
+    for n in entry["lengths"]:
+        if first + n > row:
+            if row > first:
+                lengths.append(row - first)
+            break
+        lengths.append(n)
+        first += n
+    entry.update(next_row=row, lengths=lengths, blank=0, block_end=[min(e, row - 1) for e in entry["block_end"]])
+
+def read_chunks(plant_dir, name, lengths):
+    rows = []
+    for i, n in enumerate(lengths):
+        rows.extend(json.loads((plant_dir / "raw" / f"{name}_{i:05d}.json").read_text())[:n])
+    return rows
+
+def backfill(plant_id, plant, creds_info, chunk_rows, restart):
+    plant_dir = HISTORY_DIR / plant_id
+    if restart and plant_dir.exists():
+        shutil.rmtree(plant_dir)
+    (plant_dir / "raw").mkdir(parents=True, exist_ok=True)
+    state_path = plant_dir / "state.json"
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    if state:
+        print(f"Resuming {plant_id} from {state_path}")
+
+    sh = authorize(creds_info).open_by_key(plant["spreadsheet_id"])
+    dash_ws = sh.worksheet(plant["dashboard_sheet"])
+    sr_ws = sh.worksheet(plant["sales_report_sheet"])
+    fetch_chunks(dash_ws, "dashboard", plant_dir, state, chunk_rows)
+    fetch_chunks(sr_ws, "sales_report", plant_dir, state, chunk_rows)
+
+    raw = {
+        "rows": read_chunks(plant_dir, "dashboard", state["dashboard"]["lengths"]),
+        "sr_rows": read_chunks(plant_dir, "sales_report", state["sales_report"]["lengths"]),
+        "fetch_timing": {},
+    }
+    raw["version"] = raw_version(raw)
+    snapshot = parse_data(raw)
+
+    snapshot.df.to_parquet(plant_dir / "dashboard.parquet", index=False)
+    snapshot.sale_df.to_parquet(plant_dir / "sales.parquet", index=False)
+    snapshot.rej_df.to_parquet(plant_dir / "rejection.parquet", index=False)
+    snapshot.wokus_sale_df.to_parquet(plant_dir / "sales_wokus.parquet", index=False)
+    snapshot.sales_cube.to_parquet(plant_dir / "sales_cube.parquet", index=False)
+    write_json_atomic(plant_dir / "meta.json", {
+        "version": snapshot.version, "written_at": time.time(), "month_targets": snapshot.month_targets,
+        "cols": snapshot.cols, "cells": snapshot.cells,
+        "first_date": str(snapshot.df[snapshot.cols["date"]].min()) if not snapshot.df.empty else None,
+        "last_date": str(snapshot.df[snapshot.cols["date"]].max()) if not snapshot.df.empty else None,
+    })
+    print(f"{plant_id}: {len(snapshot.df)} dashboard days, {len(snapshot.sale_df)} sale rows, "
+          f"{len(snapshot.rej_df)} rejection rows written to {plant_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill full sheet history into a local Parquet store")
+    parser.add_argument("--plant", action="append", help="plant id from plants.toml (default: all)")
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--credentials", help="service account JSON (default: .streamlit/secrets.toml)")
+    parser.add_argument("--restart", action="store_true", help="discard checkpoints and start over")
+    args = parser.parse_args()
+
+    plants = read_plants(PLANTS_CONFIG)
+    creds_info = load_creds_info(args.credentials)
+    for plant_id in args.plant or list(plants):
+        if plant_id not in plants:
+            parser.error(f"unknown plant {plant_id!r}, expected one of {', '.join(plants)}")
+        backfill(plant_id, plants[plant_id], creds_info, args.chunk_rows, args.restart)
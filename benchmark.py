@@ -0,0 +1,94 @@
+# End-to-end benchmark against synthetic sheets - times ingest (fetch_raw over fake worksheets), parse,
+# the refresher's analytics pass, build_grid_state's month filter / figure build / serialization laps and
+# the static HTML render, for each sheet size. Several plants are also ingested concurrently, as the app does.
+#   python benchmark.py [--months 1 12 60 120] [--plants 3] [--repeat 5] [--latency-ms 150] [--json bench.json]
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from plotly.offline import get_plotlyjs
+
+from dashboard_analytics import month_projections, update_rejection_anomalies, update_rolling
+from dashboard_data import DASHBOARD_SHEET, SALES_REPORT_SHEET, fetch_raw, parse_data
+from dashboard_quota import API_CALLS
+from dashboard_render import build_grid_state
+from dashboard_timing import STAGES
+from export_snapshot import render_static_html
+from synthetic_sheets import fake_worksheets, generate_plant
+
+RENDER_LAPS = ("filter", "kpis", "figures", "values", "serialize")
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+def bench_size(months, args, plotly_js, pool):
+    sheets = generate_plant(months, seed=months, end=args.end)
+    results = {}
+    for i in range(args.repeat):
+        # A fresh spreadsheet id per run keeps single-flight from coalescing across repeats
+        ws = fake_worksheets(sheets, f"bench-{months}-{i}", args.latency_ms / 1000, args.per_1k_rows_ms / 1000)
+        raw, t_ingest = timed(lambda: fetch_raw(ws[DASHBOARD_SHEET], ws[SALES_REPORT_SHEET], pool))
+        snapshot, t_parse = timed(lambda: parse_data(raw))
+
+        def analytics():
+            update_rolling(snapshot)
+            month_projections(snapshot)
+            update_rejection_anomalies(snapshot)
+        _, t_analytics = timed(analytics)
+
+        month = sorted(snapshot.month_targets, key=lambda m: time.strptime(m, "%b-%Y"))[-1]
+        state, t_grid = timed(lambda: build_grid_state(snapshot, month, args.span))
+        # build_grid_state records its own laps; the latest sample of each is this run's
+        laps = STAGES.summary()
+        html, t_html = timed(lambda: render_static_html(state, "", 0, plotly_js))
+
+        run = {"ingest": t_ingest, "parse": t_parse, "analytics": t_analytics, "grid": t_grid, "html": t_html}
+        run.update({f"grid:{lap}": laps[f"render:{lap}"]["last_ms"] / 1000 for lap in RENDER_LAPS})
+        for stage, seconds in run.items():
+            results.setdefault(stage, []).append(seconds)
+    rows = {"dashboard": len(sheets[DASHBOARD_SHEET]) - 1, "sales_report": len(sheets[SALES_REPORT_SHEET]) - 1,
+            "html_kb": len(html) // 1024}
+    return rows, {stage: statistics.median(samples) * 1000 for stage, samples in results.items()}
+
+def bench_plants(months, args):
+    plants = [fake_worksheets(generate_plant(months, seed=p, end=args.end), f"bench-plant-{p}",
+                              args.latency_ms / 1000, args.per_1k_rows_ms / 1000) for p in range(args.plants)]
+    pools = [ThreadPoolExecutor(max_workers=4) for _ in plants]
+    with ThreadPoolExecutor(max_workers=len(plants)) as outer:
+        _, wall = timed(lambda: list(outer.map(
+            lambda pw: parse_data(fetch_raw(pw[0][DASHBOARD_SHEET], pw[0][SALES_REPORT_SHEET], pw[1])), zip(plants, pools))))
+    return wall * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest/parse/render against synthetic sheets")
+    parser.add_argument("--months", type=int, nargs="+", default=[1, 12, 60, 120], help="sheet sizes in months of history")
+    parser.add_argument("--plants", type=int, default=3, help="plants ingested concurrently for the multi-plant run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--span", type=int, default=1, help="trend span in months for the grid build")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated Sheets round trip per read")
+    parser.add_argument("--per-1k-rows-ms", type=float, default=0.0, help="simulated transfer time per 1000 rows")
+    parser.add_argument("--end", default="2026-02-20", help="last generated day, fixed so runs are comparable")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Fake worksheets still go through get_values_once; keep their calls out of the quota history
+    API_CALLS.open(":memory:")
+    plotly_js = get_plotlyjs()
+    pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bench-fetch")
+    report = []
+    stages = ["ingest", "parse", "analytics", "grid"] + [f"grid:{lap}" for lap in RENDER_LAPS] + ["html"]
+    print(f"{'months':>6} {'dash rows':>9} {'sr rows':>8} " + " ".join(f"{s:>14}" for s in stages) + f" {'plants x' + str(args.plants):>10}")
+    for months in args.months:
+        rows, medians = bench_size(months, args, plotly_js, pool)
+        plants_ms = bench_plants(months, args) if args.plants > 1 else None
+        report.append({"months": months, **rows, "median_ms": medians, "plants": args.plants, "plants_wall_ms": plants_ms})
+        print(f"{months:>6} {rows['dashboard']:>9} {rows['sales_report']:>8} "
+              + " ".join(f"{medians[s]:>14.1f}" for s in stages)
+              + (f" {plants_ms:>10.1f}" if plants_ms is not None else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
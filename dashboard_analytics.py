@@ -0,0 +1,367 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+# Derived views over a Snapshot's frames. Results are memoized in snapshot.views, so they are built
+# at most once per data version and dropped together with the snapshot.
+
+FISCAL_YEAR_START = 4  # April
+COMPARISONS = ["Month", "Quarter", "Fiscal year", "Same month last year"]
+
+# Position of the first day that differs between two day-indexed frames (len(new) if new only appends)
+def first_changed(new, old):
+    n = min(len(new), len(old))
+    head, prev_head = new.iloc[:n], old.iloc[:n]
+    same = (head.index == prev_head.index) & ((head.to_numpy() == prev_head.to_numpy())
+                                              | (head.isna().to_numpy() & prev_head.isna().to_numpy())).reshape(n, -1).all(axis=1)
+    return n if same.all() else int(same.argmin())
+
+def memoized(snapshot, key, build):
+    if key not in snapshot.views:
+        snapshot.views[key] = build()
+    return snapshot.views[key]
+
+def pct_series(s):
+    # Vectorized ensure_pct: fractions (<= 5) are scaled to percent
+    s = pd.to_numeric(s, errors="coerce")
+    return s.where(s > 5, s * 100)
+
+# Monthly KPI table - one grouped pass per frame, every period view is a slice of this
+def monthly_kpis(snapshot):
+    def build():
+        cols, df = snapshot.cols, snapshot.df
+        sale, wokus = daily_sales(snapshot), daily_sales(snapshot, "W/O KUS")
+        parts = {
+            "sale": sale.groupby(sale.index.asfreq("M")).sum(),
+            "sale_days": sale.groupby(sale.index.asfreq("M")).size(),
+            "sale_wokus": wokus.groupby(wokus.index.asfreq("M")).sum(),
+            "rej_amt": snapshot.rej_df.groupby(snapshot.rej_df["date"].dt.to_period("M"))["rej amt"].sum(),
+        }
+        if not df.empty:
+            month_key = df[cols["date"]].dt.to_period("M")
+            parts["oee_avg"] = pct_series(df[cols["oee"]]).groupby(month_key).mean()
+            parts["rej_pct_avg"] = pct_series(df[cols["rej_pct"]]).groupby(month_key).mean()
+            if cols["copq"]:
+                parts["copq"] = df[cols["copq"]].groupby(month_key).sum(min_count=1)
+        monthly = pd.DataFrame(parts).sort_index()
+        targets = pd.Series({pd.Period(pd.to_datetime(m, format="%b-%Y"), "M"): t for m, t in snapshot.month_targets.items()},
+                            dtype=float)
+        monthly["target"] = targets.reindex(monthly.index)
+        return monthly
+    return memoized(snapshot, "monthly_kpis", build)
+
+def fiscal_year_start(period):
+    year = period.year if period.month >= FISCAL_YEAR_START else period.year - 1
+    return pd.Period(year=year, month=FISCAL_YEAR_START, freq="M")
+
+def fiscal_label(period, kind):
+    fy_year = fiscal_year_start(period).year
+    fy = f"FY{str(fy_year)[-2:]}-{str(fy_year + 1)[-2:]}"
+    if kind == "Quarter":
+        return f"Q{(period.month - FISCAL_YEAR_START) % 12 // 3 + 1} {fy}"
+    return fy
+
+# (current months, comparison months) for a selected month; quarter and fiscal year are to-date
+def period_months(month, kind):
+    end = pd.Period(pd.to_datetime(month, format="%b-%Y"), "M")
+    if kind == "Same month last year":
+        return (pd.period_range(end, end, freq="M"), pd.period_range(end - 12, end - 12, freq="M"),
+                end.strftime("%b-%Y"), (end - 12).strftime("%b-%Y"))
+    fy_start = fiscal_year_start(end)
+    if kind == "Quarter":
+        start = fy_start + (end - fy_start).n // 3 * 3
+    elif kind == "Fiscal year":
+        start = fy_start
+    else:
+        start = end
+    current = pd.period_range(start, end, freq="M")
+    label = fiscal_label(start, kind) if kind != "Month" else end.strftime("%b-%Y")
+    prev_label = fiscal_label(start - 12, kind) if kind != "Month" else (end - 12).strftime("%b-%Y")
+    return current, pd.period_range(start - 12, end - 12, freq="M"), label, prev_label
+
+def aggregate_period(monthly, months):
+    rows = monthly.reindex(months)
+    # Averages are weighted by sale days so a short month does not count as much as a full one
+    weights = rows["sale_days"].fillna(0)
+    def weighted(col):
+        if col not in rows or weights.sum() == 0:
+            return float("nan")
+        valid = rows[col].notna()
+        return (rows.loc[valid, col] * weights[valid]).sum() / weights[valid].sum() if weights[valid].sum() else float("nan")
+    sale, target = rows["sale"].sum(), rows["target"].sum(min_count=1)
+    # Achievement only counts sales from months that have a target
+    targeted_sale = rows.loc[rows["target"].notna(), "sale"].sum()
+    return {
+        "Sale (with kus)": sale,
+        "Sale (w/o kus)": rows["sale_wokus"].sum() if "sale_wokus" in rows else 0.0,
+        "Rejection Amount": rows["rej_amt"].sum(),
+        "COPQ": rows["copq"].sum() if "copq" in rows else float("nan"),
+        "OEE % (avg)": weighted("oee_avg"),
+        "Rejection % (avg)": weighted("rej_pct_avg"),
+        "Target": target,
+        "Achievement %": targeted_sale / target * 100 if pd.notna(target) and target > 0 else float("nan"),
+        "Sale days": int(weights.sum()),
+    }
+
+# Comparison table for the selected month and view, cached per (kind, month) on the snapshot
+def comparison_view(snapshot, kind, month):
+    def build():
+        current, previous, label, prev_label = period_months(month, kind)
+        monthly = monthly_kpis(snapshot)
+        cur, prev = aggregate_period(monthly, current), aggregate_period(monthly, previous)
+        view = pd.DataFrame({label: cur, prev_label: prev})
+        view["Change %"] = (view[label] - view[prev_label]) / view[prev_label].abs() * 100
+        view.loc[view[prev_label] == 0, "Change %"] = float("nan")
+        return view
+    return memoized(snapshot, ("comparison", kind, month), build)
+
+# Rolling OEE / rejection % / COPQ - time-based windows over one row per day. The refresher hands the
+# previous snapshot in, and only days from the first changed one (minus the widest window) are recomputed.
+ROLLING_WINDOWS = (7, 30)
+ROLLING_METRICS = ("oee", "rej_pct", "copq")
+
+def daily_metrics(snapshot):
+    cols, df = snapshot.cols, snapshot.df
+    daily = pd.DataFrame({
+        "oee": pct_series(df[cols["oee"]]).to_numpy(),
+        "rej_pct": pct_series(df[cols["rej_pct"]]).to_numpy(),
+        "copq": pd.to_numeric(df[cols["copq"]], errors="coerce").to_numpy() if cols["copq"] else float("nan"),
+    }, index=pd.DatetimeIndex(df[cols["date"]]))
+    return daily.groupby(level=0).last().sort_index()
+
+def compute_rolling(daily):
+    out = {}
+    for w in ROLLING_WINDOWS:
+        window = daily.rolling(f"{w}D", min_periods=1)
+        for stat in ("mean", "min", "max"):
+            values = getattr(window, stat)()
+            for m in ROLLING_METRICS:
+                out[f"{m}_{w}d_{stat}"] = values[m]
+    return pd.DataFrame(out, index=daily.index)
+
+def update_rolling(snapshot, previous=None):
+    daily = daily_metrics(snapshot)
+    prev = previous.views.get("rolling") if previous is not None else None
+    if prev is None:
+        snapshot.views["rolling"] = (daily, compute_rolling(daily))
+        return
+    prev_daily, prev_roll = prev
+    first_diff = first_changed(daily, prev_daily)
+    if first_diff == len(daily):
+        roll = prev_roll.iloc[:first_diff]
+    else:
+        changed_from = daily.index[first_diff]
+        tail = daily[daily.index > changed_from - pd.Timedelta(days=max(ROLLING_WINDOWS))]
+        tail_roll = compute_rolling(tail)
+        roll = pd.concat([prev_roll.iloc[:first_diff], tail_roll[tail_roll.index >= changed_from]])
+    snapshot.views["rolling"] = (daily, roll)
+
+def rolling_stats(snapshot):
+    if "rolling" not in snapshot.views:
+        update_rolling(snapshot)
+    return snapshot.views["rolling"][1]
+
+# Slice of the daily sales cube - filters on the categorical codes, then one groupby.
+# by: any of "sales_type", "kus"; freq: "D", "W", "M", "Q" or None for a single total per group.
+def cube_slice(snapshot, start=None, end=None, sales_type=None, kus=None, by=(), freq="D"):
+    cube = snapshot.sales_cube
+    mask = pd.Series(True, index=cube.index)
+    if start is not None:
+        mask &= cube["date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= cube["date"] <= pd.Timestamp(end)
+    for col, wanted in (("sales_type", sales_type), ("kus", kus)):
+        if wanted is not None:
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            mask &= cube[col].isin([w.upper() if col == "sales_type" else w for w in wanted])
+    rows = cube[mask]
+    keys = list(by)
+    if freq:
+        keys = [rows["date"].dt.to_period(freq).rename("period")] + keys
+    if not keys:
+        return rows["amount"].sum()
+    return rows.groupby(keys, observed=True)["amount"].sum()
+
+# Daily sale totals (PeriodIndex, freq D) from the cube: OEE with KUS as on the dashboard, or W/O KUS.
+# When the Sales Report has no OEE rows the Dashboard's own daily column stands in, as in parse_data.
+def daily_sales(snapshot, kus="KUS"):
+    def build():
+        if kus != "KUS":
+            return cube_slice(snapshot, kus=kus)
+        daily = cube_slice(snapshot, sales_type="OEE", kus=kus)
+        if daily.empty:
+            sale = snapshot.sale_df
+            daily = sale.groupby(sale["date"].dt.to_period("D"))["sale amount"].sum().rename_axis("period")
+        return daily
+    return memoized(snapshot, ("daily_sales", kus), build)
+
+# Month-end projection for every target month - run-rate over elapsed working days, vectorized with
+# numpy business-day counts. Sundays are off unless WORKING_WEEKMASK says otherwise.
+WORKING_WEEKMASK = "Mon Tue Wed Thu Fri Sat"
+
+def month_projections(snapshot):
+    today = pd.Timestamp.today().normalize()
+
+    def build():
+        months = sorted(snapshot.month_targets, key=lambda m: pd.to_datetime(m, format="%b-%Y"))
+        cols = ["target", "sold", "elapsed_days", "remaining_days", "run_rate", "projected", "projected_pct", "required_daily"]
+        if not months:
+            return pd.DataFrame(columns=cols)
+        periods = pd.PeriodIndex([pd.Period(pd.to_datetime(m, format="%b-%Y"), "M") for m in months])
+        sale = daily_sales(snapshot)
+        by_month = sale.groupby(sale.index.asfreq("M"))
+        sold = by_month.sum().reindex(periods).fillna(0).to_numpy()
+        last_day = pd.Series(sale.index.to_timestamp(), index=sale.index).groupby(sale.index.asfreq("M")).max().reindex(periods)
+        month_start = periods.start_time.to_numpy().astype("datetime64[D]")
+        month_end_excl = (periods.end_time.normalize() + pd.Timedelta(days=1)).to_numpy().astype("datetime64[D]")
+        # Days up to and including the last day with a sale count as elapsed, and so does every day before
+        # today - a month that is over has nothing remaining even if its last days had no sales
+        cutoff = (last_day.fillna(pd.Series(periods.start_time - pd.Timedelta(days=1), index=periods))
+                  + pd.Timedelta(days=1)).to_numpy().astype("datetime64[D]")
+        cutoff = np.maximum(cutoff, np.minimum(np.datetime64(today.date(), "D"), month_end_excl))
+        elapsed = np.busday_count(month_start, cutoff, weekmask=WORKING_WEEKMASK)
+        remaining = np.busday_count(cutoff, month_end_excl, weekmask=WORKING_WEEKMASK)
+        target = np.array([snapshot.month_targets[m] for m in months], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            run_rate = np.where(elapsed > 0, sold / elapsed, 0.0)
+            projected = sold + run_rate * remaining
+            projected_pct = np.where(target > 0, projected / target * 100, np.nan)
+            required_daily = np.where(remaining > 0, np.maximum(target - sold, 0) / remaining, np.nan)
+        return pd.DataFrame(dict(zip(cols, [target, sold, elapsed, remaining, run_rate, projected, projected_pct, required_daily])),
+                            index=months)
+    # Keyed by day as well - a snapshot can outlive midnight when the sheet has not changed
+    return memoized(snapshot, ("month_projections", today), build)
+
+# Rejection spikes - EWMA mean/variance band over daily rejection totals. Each day is one O(1) update of
+# the running state; the state after every day is kept, so a new snapshot resumes from the day before the
+# first change instead of rescanning history.
+ANOMALY_ALPHA = 0.2
+ANOMALY_Z = 3.0
+ANOMALY_WARMUP = 7
+
+def ewma_step(state, x):
+    mean, var, n = state
+    if n == 0:
+        return (x, 0.0, 1), float("nan"), False
+    std = var ** 0.5
+    z = (x - mean) / std if std > 0 else float("nan")
+    anomaly = n >= ANOMALY_WARMUP and pd.notna(z) and z > ANOMALY_Z
+    diff = x - mean
+    incr = ANOMALY_ALPHA * diff
+    return (mean + incr, (1 - ANOMALY_ALPHA) * (var + diff * incr), n + 1), z, anomaly
+
+def update_rejection_anomalies(snapshot, previous=None):
+    daily = snapshot.rej_df.groupby("date")["rej amt"].sum().sort_index().to_frame("amount")
+    prev = previous.views.get("rej_anomalies") if previous is not None else None
+    records, state, start = [], (0.0, 0.0, 0), 0
+    if prev is not None:
+        prev_daily, prev_table = prev
+        start = first_changed(daily, prev_daily)
+        records = prev_table.iloc[:start].to_dict("records")
+        if start:
+            last = records[-1]
+            state = (last["state_mean"], last["state_var"], int(last["state_n"]))
+    for x in daily["amount"].to_numpy()[start:]:
+        band_mean, band_var = state[0], state[1]
+        state, z, anomaly = ewma_step(state, float(x))
+        records.append({"amount": float(x), "band_mean": band_mean, "band_std": band_var ** 0.5, "z": z, "anomaly": anomaly,
+                        "state_mean": state[0], "state_var": state[1], "state_n": state[2]})
+    table = pd.DataFrame(records, index=daily.index,
+                         columns=["amount", "band_mean", "band_std", "z", "anomaly", "state_mean", "state_var", "state_n"])
+    snapshot.views["rej_anomalies"] = (daily, table)
+
+def rejection_anomalies(snapshot):
+    if "rej_anomalies" not in snapshot.views:
+        update_rejection_anomalies(snapshot)
+    return snapshot.views["rej_anomalies"][1]
+
+# Exports - month-range slices of the parsed frames, serialized on demand without touching Sheets.
+# Large ranges default to Parquet, which is several times smaller than CSV and keeps dtypes.
+EXPORT_DATASETS = {"Sales": "sale_df", "Rejection": "rej_df", "Sales W/O KUS": "wokus_sale_df", "Monthly KPIs": None}
+EXPORT_PARQUET_ROWS = 20000
+
+def export_months(snapshot):
+    return [p.strftime("%b-%Y") for p in monthly_kpis(snapshot).index]
+
+def export_frame(snapshot, dataset, start_month, end_month):
+    start = pd.Period(pd.to_datetime(start_month, format="%b-%Y"), "M")
+    end = pd.Period(pd.to_datetime(end_month, format="%b-%Y"), "M")
+    attr = EXPORT_DATASETS[dataset]
+    if attr is None:
+        monthly = monthly_kpis(snapshot)
+        monthly = monthly[(monthly.index >= start) & (monthly.index <= end)]
+        return monthly.rename_axis("month").reset_index().assign(month=lambda f: f["month"].dt.strftime("%b-%Y"))
+    frame = getattr(snapshot, attr)
+    if frame.empty:
+        return frame
+    months = frame["date"].dt.to_period("M")
+    return frame[(months >= start) & (months <= end)].reset_index(drop=True)
+
+def export_format(frame):
+    return "parquet" if len(frame) >= EXPORT_PARQUET_ROWS else "csv"
+
+def export_bytes(frame, fmt):
+    if fmt == "parquet":
+        buf = io.BytesIO()
+        frame.to_parquet(buf, index=False)
+        return buf.getvalue()
+    return frame.to_csv(index=False).encode("utf-8")
+
+# KPI API payloads - plain numbers (no formatting) for the selected month's latest day, memoized per month
+def json_scalar(v):
+    if v is None or isinstance(v, str):
+        return v
+    if pd.isna(v):
+        return None
+    return v.item() if hasattr(v, "item") else v
+
+def month_kpis(snapshot, month):
+    def build():
+        cols, df = snapshot.cols, snapshot.df
+        period = pd.Period(pd.to_datetime(month, format="%b-%Y"), "M")
+        days = df[df[cols["date"]].dt.to_period("M") == period] if not df.empty else df
+        sale, wokus = daily_sales(snapshot), daily_sales(snapshot, "W/O KUS")
+        sales = sale[sale.index.asfreq("M") == period].sum()
+        wokus_days = wokus[wokus.index.asfreq("M") == period]
+        target = snapshot.month_targets.get(month)
+        kpis = {"month": month, "date": None, "sale": None, "oee": None, "rej_amt": None, "rej_pct": None,
+                "copq": None, "copq_cum": None, "rej_cum": None, "sale_cum": None, "month_sale": float(sales),
+                "sale_wokus": wokus_days.iloc[-1] if not wokus_days.empty else None, "month_sale_wokus": float(wokus_days.sum()),
+                "target": target, "achieved_pct": round(sales / target * 100, 2) if target and target > 0 else None}
+        if not days.empty:
+            latest = days.iloc[-1]
+            last_valid = lambda col: days[col].dropna().iloc[-1] if col and not days[col].dropna().empty else None
+            kpis.update({
+                "date": latest[cols["date"]].strftime("%Y-%m-%d"),
+                "sale": latest[cols["today"]],
+                "oee": pct_series(days[cols["oee"]]).iloc[-1],
+                "rej_amt": latest[cols["rej_day"]],
+                "rej_pct": pct_series(days[cols["rej_pct"]]).iloc[-1],
+                "copq": latest[cols["copq"]] if cols["copq"] else None,
+                "copq_cum": latest[cols["copq_cum"]] if cols["copq_cum"] else None,
+                "rej_cum": last_valid(cols["rej_cum"]),
+                "sale_cum": last_valid(cols["total_cum"]),
+            })
+        return {k: json_scalar(v) for k, v in kpis.items()}
+    return memoized(snapshot, ("month_kpis", month), build)
+
+# One row per day: sale and rejection totals plus OEE / rejection % / COPQ, as JSON-ready records
+def daily_series(snapshot, start=None, end=None):
+    def build():
+        sale = snapshot.sale_df.groupby("date")["sale amount"].sum().rename("sale")
+        rej = snapshot.rej_df.groupby("date")["rej amt"].sum().rename("rej_amt")
+        daily = pd.concat([sale, rej, daily_metrics(snapshot)], axis=1).sort_index()
+        return daily.rename_axis("date")
+    daily = memoized(snapshot, "daily_series", build)
+    if start is not None:
+        daily = daily[daily.index >= pd.Timestamp(start)]
+    if end is not None:
+        daily = daily[daily.index <= pd.Timestamp(end)]
+    return json.loads(daily.reset_index().to_json(orient="records", date_format="iso", date_unit="s"))
+
+def monthly_records(snapshot):
+    monthly = monthly_kpis(snapshot).rename_axis("month").reset_index()
+    monthly["month"] = monthly["month"].dt.strftime("%b-%Y")
+    return json.loads(monthly.to_json(orient="records"))
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import threading
+import time
+import tomllib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import gspread
+import numpy as np
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+from google.oauth2.service_account import Credentials
+
+from dashboard_quota import API_CALLS
+from dashboard_timing import STAGES, TIMING_LOG_EVERY_S
+
+# Sheet loading and parsing shared by the Streamlit app (final d.py) and the command-line tools.
+# None of the dashboard_* modules import streamlit, so the tools can use them without a running app.
+
+APP_DIR = Path(__file__).parent
+SECRETS_FILE = APP_DIR / ".streamlit" / "secrets.toml"
+SPREADSHEET_ID = "168UoOWdTfOBxBvy_4QGymfiIRimSO2OoJdnzBDRPLvk"
+DASHBOARD_SHEET = "Dashboard"
+SALES_REPORT_SHEET = "Sales Report"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets","https://www.googleapis.com/auth/drive"]
+# Monthly targets live in A11:B14 of the Dashboard sheet, which the full read already covers
+TARGET_ROWS = slice(10, 14)
+
+class DataLoadError(Exception):
+    pass
+
+# Command-line tools read the same [gcp_service_account] block the app gets from st.secrets
+def load_creds_info(credentials_path=None):
+    if credentials_path:
+        return json.loads(Path(credentials_path).read_text())
+    if SECRETS_FILE.exists():
+        with open(SECRETS_FILE, "rb") as f:
+            secrets = tomllib.load(f)
+        if "gcp_service_account" in secrets:
+            return secrets["gcp_service_account"]
+    raise DataLoadError(f"No credentials: pass --credentials or add [gcp_service_account] to {SECRETS_FILE}")
+
+def authorize(creds_info):
+    try:
+        creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+        return gspread.authorize(creds)
+    except Exception as e:
+        raise DataLoadError(f"Google auth failed: {e}")
+
+def find_col(df, target):
+    norm_target = target.lower().replace(" ", "").replace("%", "").replace("(", "").replace(")", "")
+    for c in df.columns:
+        norm_c = str(c).lower().replace(" ", "").replace("%", "").replace("(", "").replace(")", "")
+        if norm_c == norm_target:
+            return c
+    return None
+
+# Plants config - plants.toml, falling back to the single default sheet
+def read_plants(path):
+    plants = {}
+    if path.exists():
+        with open(path, "rb") as f:
+            for plant_id, p in tomllib.load(f).get("plants", {}).items():
+                plants[plant_id] = {
+                    "name": p.get("name", plant_id),
+                    "spreadsheet_id": p["spreadsheet_id"],
+                    "dashboard_sheet": p.get("dashboard_sheet", DASHBOARD_SHEET),
+                    "sales_report_sheet": p.get("sales_report_sheet", SALES_REPORT_SHEET),
+                }
+    return plants or {"default": {"name": "Factory", "spreadsheet_id": SPREADSHEET_ID,
+                                  "dashboard_sheet": DASHBOARD_SHEET, "sales_report_sheet": SALES_REPORT_SHEET}}
+
+# Single-flight - concurrent reads of the same spreadsheet/range wait on one in-flight call and share its result
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.counters = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self.lock:
+            self.counters["calls"] += 1
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self.inflight[key] = call
+                self.counters["executed"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            call["done"].set()
+        return call["result"]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+# One per process, shared by every plant refresher, session and exporter loop
+FETCH_FLIGHT = SingleFlight()
+
+# Only the caller that actually reaches Google is counted as an API call, the rest as coalesced hits
+def get_values_once(ws, range_name=None, origin=None):
+    key = (ws.spreadsheet_id, ws.title, range_name)
+    ran = []
+
+    def read():
+        ran.append(True)
+        with API_CALLS.call("values.get", f"{ws.title}!{range_name or 'all'}", origin):
+            return ws.get_values(range_name) if range_name else ws.get_values()
+    values = FETCH_FLIGHT.do(key, read)
+    if not ran:
+        API_CALLS.hit("coalesced", origin)
+    return values
+
+# Raw sheet values - the independent reads go out together on a small pool and are joined before parsing.
+# The data version is a hash of exactly what Google returned. The summary line is printed at most every
+# TIMING_LOG_EVERY_S, like the stage percentiles.
+FETCH_LOG = {"last_logged": 0.0}
+
+def fetch_raw(dash_ws, sr_ws, pool, origin=None):
+    reads = {
+        "rows": lambda: get_values_once(dash_ws, origin=origin),
+        "sr_rows": (lambda: get_values_once(sr_ws, origin=origin)) if sr_ws is not None else list,
+    }
+    timings = {}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = time.perf_counter() - t0
+            STAGES.record(f"get_values:{name}", timings[name])
+
+    t0 = time.perf_counter()
+    futures = {name: pool.submit(timed, name, fn) for name, fn in reads.items()}
+    raw = {}
+    for name, fut in futures.items():
+        try:
+            raw[name] = fut.result()
+        except Exception as e:
+            if name == "rows":
+                raise DataLoadError(f"Cannot read Dashboard sheet: {e}")
+            raw[name] = []
+    wall = time.perf_counter() - t0
+    STAGES.record("fetch", wall)
+    raw["fetch_timing"] = {"reads": timings, "wall": wall, "sequential": sum(timings.values())}
+    if time.time() - FETCH_LOG["last_logged"] >= TIMING_LOG_EVERY_S:
+        FETCH_LOG["last_logged"] = time.time()
+        flight = FETCH_FLIGHT.stats()
+        print(f"Fetched {len(reads)} ranges in {wall:.2f}s (sequential {raw['fetch_timing']['sequential']:.2f}s, "
+              f"saved {raw['fetch_timing']['sequential'] - wall:.2f}s; {flight['coalesced']}/{flight['calls']} calls coalesced so far)")
+    raw["version"] = raw_version(raw)
+    return raw
+
+def raw_version(raw):
+    parts = [raw["rows"], raw["sr_rows"]]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()[:12]
+
+# Parsed frames - a Snapshot is never mutated after it is built, the refresher swaps in a new one
+@dataclass(frozen=True)
+class Snapshot:
+    version: str
+    loaded_at: float
+    df: pd.DataFrame
+    sale_df: pd.DataFrame
+    rej_df: pd.DataFrame
+    wokus_sale_df: pd.DataFrame
+    month_targets: dict
+    cols: dict
+    cells: dict
+    fetch_timing: dict
+    sales_cube: pd.DataFrame
+    day_index: dict
+    # Memo for derived views (dashboard_analytics) - filled lazily, never replaces the frames above
+    views: dict = field(default_factory=dict, compare=False)
+
+# Daily sales cube - date x sales type x KUS flag, every sales type kept (the dashboard itself only shows OEE).
+# A-C hold date/type/amount with KUS; Q/S hold date/amount without KUS and carry no type, so those rows are "ALL".
+# Each block's dates are parsed on their own, as parse_data does - the blocks need not share a date format.
+CUBE_KUS = ["KUS", "W/O KUS"]
+
+def build_sales_cube(sr_rows):
+    body = sr_rows[1:] if sr_rows else []
+    kus = pd.DataFrame([(r[0], r[1], r[2]) for r in body if len(r) >= 3 and (r[0] or "").strip()],
+                       columns=["date", "sales_type", "amount"])
+    kus["kus"] = "KUS"
+    wokus = pd.DataFrame([(r[16], "ALL", r[18]) for r in body if len(r) > 18 and (r[16] or "").strip() and r[18] not in (None, "")],
+                         columns=["date", "sales_type", "amount"])
+    wokus["kus"] = "W/O KUS"
+    for block in (kus, wokus):
+        block["date"] = pd.to_datetime(block["date"].astype(str).str.strip(), errors="coerce")
+    cube = pd.concat([kus, wokus], ignore_index=True)
+    cube["amount"] = pd.to_numeric(cube["amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+    cube["sales_type"] = cube["sales_type"].astype(str).str.strip().str.upper()
+    cube = cube[cube["date"].notna() & (cube["sales_type"] != "")]
+    cube["sales_type"] = cube["sales_type"].astype("category")
+    cube["kus"] = pd.Categorical(cube["kus"], categories=CUBE_KUS)
+    return cube.groupby(["date", "sales_type", "kus"], observed=True, sort=True)["amount"].sum().reset_index()
+
+# Drill-down index - Sales Report rows ordered by each block's date column, with (start, stop) positions per
+# day, so looking up a clicked day touches only that day's rows. Chart name -> date column (A, K, Q) and the
+# block's columns (A-C, K-L, Q-S); the blocks are unrelated lists sharing rows, so only the chart's own is shown.
+DRILL_DATE_COLUMNS = {"sale": 0, "rej": 10, "sale_wokus": 16}
+DRILL_BLOCK_COLUMNS = {"sale": slice(0, 3), "rej": slice(10, 12), "sale_wokus": slice(16, 19)}
+
+def build_day_index(sr_rows):
+    body = sr_rows[1:] if sr_rows else []
+    width = max([len(sr_rows[0])] + [len(r) for r in body]) if sr_rows else 0
+    header = list(sr_rows[0]) + [""] * (width - len(sr_rows[0])) if sr_rows else []
+    letters = [rowcol_to_a1(1, i + 1)[:-1] for i in range(width)]
+    columns = [f"{letter} {h.strip()}" if h.strip() else letter for letter, h in zip(letters, header)]
+    rows = pd.DataFrame([list(r) + [""] * (width - len(r)) for r in body], columns=columns)
+    rows.insert(0, "Sheet row", np.arange(2, len(body) + 2))
+    index = {"rows": rows, "charts": {}}
+    for chart, col in DRILL_DATE_COLUMNS.items():
+        if col >= width:
+            continue
+        dates = pd.to_datetime(rows[columns[col]].astype(str).str.strip(), errors="coerce").dt.normalize()
+        valid = np.flatnonzero(dates.notna().to_numpy())
+        order = valid[np.argsort(dates.to_numpy()[valid], kind="stable")]
+        days, starts, counts = np.unique(dates.to_numpy()[order], return_index=True, return_counts=True)
+        block = ["Sheet row"] + columns[DRILL_BLOCK_COLUMNS[chart]]
+        index["charts"][chart] = (order, {pd.Timestamp(d): (s, s + c) for d, s, c in zip(days, starts, counts)}, block)
+    return index
+
+# Totals the cube should agree with - OEE with KUS against sale_df (when it came from the Sales Report) and
+# W/O KUS against wokus_sale_df; returns a message per mismatch
+def check_sales_cube(cube, sale_df, wokus_sale_df, sale_from_report):
+    problems = []
+    kus = cube["kus"] == "KUS"
+    checks = [("W/O KUS", cube.loc[~kus, "amount"].sum(), wokus_sale_df["sale amount"].sum())]
+    if sale_from_report:
+        checks.append(("OEE", cube.loc[kus & (cube["sales_type"] == "OEE"), "amount"].sum(), sale_df["sale amount"].sum()))
+    for name, cube_total, frame_total in checks:
+        if not np.isclose(cube_total, frame_total):
+            problems.append(f"Sales cube {name} total {cube_total:,.0f} does not match the parsed sheet ({frame_total:,.0f})")
+    return problems
+
+def drill_rows(snapshot, chart, day):
+    order, spans, block = snapshot.day_index["charts"].get(chart, (None, {}, ["Sheet row"]))
+    span = spans.get(pd.Timestamp(day).normalize())
+    if span is None:
+        return snapshot.day_index["rows"].iloc[0:0][block]
+    return snapshot.day_index["rows"].iloc[order[span[0]:span[1]]][block]
+
+def parse_data(raw):
+    rows, sr_rows = raw["rows"], raw["sr_rows"]
+    if not rows or len(rows)<2:
+        raise DataLoadError("Dashboard sheet has no data.")
+
+    # Prepare dataframe
+    header = rows[0]
+    data_rows = [r for r in rows[1:] if any(r)]
+    dash_data = [dict(zip(header,r)) for r in data_rows]
+    df = pd.DataFrame(dash_data)
+    df.columns = df.columns.astype(str)
+
+    date_col = find_col(df,"date")
+    today_col = find_col(df,"today's sale") or find_col(df,"todays sale")
+    oee_col = find_col(df,"oee %") or find_col(df,"oee")
+    plan_col = find_col(df,"plan vs actual %")
+    rej_day_col = find_col(df,"rejection amount (daybefore)") or find_col(df,"rejection amount daybefore")
+    rej_pct_col = find_col(df,"rejection %") or find_col(df,"rejection")
+    rej_cum_col = find_col(df,"rejection amount (cumulative)") or find_col(df,"rejection amount cumulative")
+    total_cum_col = find_col(df,"total sales (cumulative)") or find_col(df,"total sales cumulative")
+    copq_col = find_col(df,"copq")
+    copq_cum_col = find_col(df,"copq cumulative") or find_col(df,"copqcumulative")
+
+    if not all([date_col, today_col, oee_col, plan_col, rej_day_col, rej_pct_col, rej_cum_col, total_cum_col]):
+        raise DataLoadError("Required dashboard columns missing")
+
+    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+    for c in df.columns:
+        if c != date_col:
+            df[c] = pd.to_numeric(df[c].astype(str).str.replace(",", ""), errors="coerce")
+    df = df.dropna(subset=[date_col]).sort_values(date_col)
+
+    # Sales report sheet - WITH KUS (existing)
+    sale_records, rej_records = [], []
+    if sr_rows and len(sr_rows)>1:
+        for r in sr_rows[1:]:
+            if len(r)>=3:
+                date_str = (r[0] or "").strip()
+                sales_type = (r[1] or "").strip().upper()
+                sale_amt = r[2]
+                if date_str and sales_type=="OEE":
+                    sale_records.append({"date": date_str,"sale amount":sale_amt})
+            if len(r)>=12:
+                rej_date_str = (r[10] or "").strip()
+                rej_amt = r[11]
+                if rej_date_str and rej_amt not in (None,""):
+                    rej_records.append({"date":rej_date_str,"rej amt":rej_amt})
+
+    sale_df = pd.DataFrame(sale_records) if sale_records else pd.DataFrame({"date":df[date_col],"sale amount":df[today_col]})
+    rej_df = pd.DataFrame(rej_records) if rej_records else pd.DataFrame({"date":df[date_col],"rej amt":df[rej_day_col]})
+
+    sale_df["date"] = pd.to_datetime(sale_df["date"], errors="coerce")
+    sale_df["sale amount"] = pd.to_numeric(sale_df["sale amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+    sale_df = sale_df.dropna(subset=["date"]).sort_values("date")
+
+    rej_df["date"] = pd.to_datetime(rej_df["date"], errors="coerce")
+    rej_df["rej amt"] = pd.to_numeric(rej_df["rej amt"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+    rej_df = rej_df.dropna(subset=["date"]).sort_values("date")
+
+    # FIXED: Sales report sheet - W/O KUS (Q1=Date, S1=Sale Amount, S2 onwards values only)
+    wokus_sale_records = []
+    if sr_rows and len(sr_rows)>1:
+        for r in sr_rows[1:]:  # Start from row 2 (data rows)
+            if len(r) > 18:  # Ensure we have S column (index 18)
+                date_str = (r[16] or "").strip()  # Q column (Date) - index 16 (17th column)
+                sale_amt = r[18]  # S column (Sale Amount) - index 18 (19th column)
+                if date_str and sale_amt not in (None, "", 0):  # Only take rows with date AND sale amount
+                    wokus_sale_records.append({"date": date_str, "sale amount": sale_amt})
+
+    wokus_sale_df = pd.DataFrame(wokus_sale_records)
+    if not wokus_sale_df.empty:
+        wokus_sale_df["date"] = pd.to_datetime(wokus_sale_df["date"], errors="coerce")
+        wokus_sale_df["sale amount"] = pd.to_numeric(wokus_sale_df["sale amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+        wokus_sale_df = wokus_sale_df.dropna(subset=["date"]).sort_values("date")
+    else:
+        wokus_sale_df = pd.DataFrame({"date": [], "sale amount": []})
+
+    # Monthly targets (UPDATED for Feb-2026 - now reading A11:B14, sliced from the full Dashboard read)
+    month_targets = {}
+    for row in rows[TARGET_ROWS]:
+        if len(row)>=2 and row[0].strip() and row[1].strip():
+            try:
+                month_dt = pd.to_datetime(row[0], format="%b-%Y")
+                month_targets[month_dt.strftime("%b-%Y")] = float(row[1].replace(",", ""))
+            except Exception:
+                continue
+
+    # K2 inventory comes from the full Dashboard read, captured once per snapshot. W/O KUS yesterday and
+    # cumulative (L2/M2) are derived per selected month from the sales cube instead.
+    cells = {"K2": rows[1][10] if len(rows[1]) > 10 else None}
+
+    # The dashboard's sale and W/O KUS figures are read from the cube, so it has to agree with the frames
+    sales_cube = build_sales_cube(sr_rows)
+    for problem in check_sales_cube(sales_cube, sale_df, wokus_sale_df, bool(sale_records)):
+        print(problem)
+
+    return Snapshot(
+        version=raw["version"], loaded_at=time.time(), cells=cells, fetch_timing=raw["fetch_timing"],
+        df=df, sale_df=sale_df, rej_df=rej_df, wokus_sale_df=wokus_sale_df, sales_cube=sales_cube,
+        day_index=build_day_index(sr_rows),
+        month_targets=month_targets,
+        cols={"date": date_col, "today": today_col, "oee": oee_col, "rej_day": rej_day_col, "rej_pct": rej_pct_col,
+              "rej_cum": rej_cum_col, "total_cum": total_cum_col, "copq": copq_col, "copq_cum": copq_cum_col},
+    )
@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Memory accounting for the long-running server. With DASHBOARD_MEMORY_PROFILE=1, tracemalloc traces the
+# process and every snapshot (raw rows, parsed frames, derived views) and session (sent grid states) is
+# sized when it changes. Grid renders are shared across sessions in one LRU; past DASHBOARD_MEMORY_LIMIT_MB
+# the oldest renders are evicted and an alert is logged.
+
+MEMORY_PROFILE = os.environ.get("DASHBOARD_MEMORY_PROFILE", "0").lower() in ("1", "true", "yes")
+MEMORY_LIMIT_MB = int(os.environ.get("DASHBOARD_MEMORY_LIMIT_MB", "0"))
+RENDER_CACHE_MAX = 64
+SESSION_IDLE_S = 3600
+MEMORY_ALERT_EVERY_S = 300
+TRACE_FRAMES = 1
+
+def deep_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+# Bytes per part of a snapshot; raw is the fetched rows it was parsed from (freed once parsing is done)
+def snapshot_memory(snapshot, raw=None):
+    sizes = {name: deep_size(getattr(snapshot, name)) for name in ("df", "sale_df", "rej_df", "wokus_sale_df", "sales_cube")}
+    sizes["day_index"] = deep_size(snapshot.day_index)
+    sizes["views"] = deep_size(snapshot.views)
+    if raw is not None:
+        sizes["raw"] = deep_size([raw["rows"], raw["sr_rows"]])
+    return sizes
+
+def state_size(state):
+    return len(json.dumps(state, default=str))
+
+# Grid states keyed by (plant, data version, month, span, zoom) - kiosks showing the same view share one
+class RenderCache:
+    def __init__(self, max_entries=RENDER_CACHE_MAX):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry and entry[0]
+
+    def put(self, key, state):
+        size = state_size(state) if MEMORY_PROFILE or MEMORY_LIMIT_MB else 0
+        with self.lock:
+            self.entries[key] = (state, size, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def total(self):
+        with self.lock:
+            return sum(size for _, size, _ in self.entries.values())
+
+    # Drops the oldest renders until at least `need` bytes are freed, keeping the newest `keep`; returns (count, bytes)
+    def evict(self, need, keep=1):
+        freed = count = 0
+        with self.lock:
+            while len(self.entries) > keep and freed < need:
+                _, (_, size, _) = self.entries.popitem(last=False)
+                freed += size
+                count += 1
+        return count, freed
+
+    def rows(self):
+        with self.lock:
+            return [{"plant": key[0], "version": key[1], "month": key[2], "span": key[3], "zoom": key[4] != "{}",
+                     "kb": size / 1024, "age_s": time.time() - created} for key, (_, size, created) in self.entries.items()]
+
+class MemoryMonitor:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = {}
+        self.sessions = {}
+        self.alerts = []
+        self.over_limit = False
+        self.last_alert = 0.0
+
+    def start(self):
+        if MEMORY_PROFILE and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def note_snapshot(self, plant_id, snapshot, raw=None):
+        if not MEMORY_PROFILE:
+            return
+        sizes = snapshot_memory(snapshot, raw)
+        with self.lock:
+            self.snapshots[plant_id] = {"version": snapshot.version, "loaded_at": snapshot.loaded_at, **sizes}
+
+    def note_session(self, session_id, plant_id, sent):
+        if not MEMORY_PROFILE:
+            return
+        size = sum(state_size(v) for flat in sent.values() for v in flat.values())
+        now = time.time()
+        with self.lock:
+            self.sessions[session_id] = {"plant": plant_id, "last_seen": now, "sent_versions": len(sent), "sent": size}
+            for sid in [sid for sid, s in self.sessions.items() if now - s["last_seen"] > SESSION_IDLE_S]:
+                del self.sessions[sid]
+
+    # Traced bytes when profiling, else what the render cache accounts for
+    def current(self, renders):
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        return renders.total()
+
+    # Over the limit, the render cache gives back what it can - never more than it holds - and the alert is
+    # logged when the limit is crossed, then at most every MEMORY_ALERT_EVERY_S while it stays over
+    def check(self, renders):
+        if not MEMORY_LIMIT_MB:
+            return
+        limit = MEMORY_LIMIT_MB * 2**20
+        used = self.current(renders)
+        if used <= limit:
+            self.over_limit = False
+            return
+        count, freed = renders.evict(min(used - limit, renders.total()))
+        now = time.time()
+        if self.over_limit and now - self.last_alert < MEMORY_ALERT_EVERY_S:
+            return
+        self.over_limit, self.last_alert = True, now
+        message = (f"Memory {used / 2**20:.0f} MB over the {MEMORY_LIMIT_MB} MB limit - "
+                   f"evicted {count} cached render(s), {freed / 2**20:.1f} MB")
+        print(message)
+        with self.lock:
+            self.alerts = (self.alerts + [(now, message)])[-20:]
+
+    def top_allocations(self, limit=15):
+        if not tracemalloc.is_tracing():
+            return []
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        return [{"site": str(stat.traceback[0]), "kb": stat.size / 1024, "blocks": stat.count} for stat in stats]
+
+RENDERS = RenderCache()
+MEMORY = MemoryMonitor()
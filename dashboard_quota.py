@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# Sheets API call accounting. Every request that actually goes to Google is recorded with its method,
+# range and origin (which refresher / session / tool triggered it); reads answered without Google
+# (single-flight coalescing, snapshot reads) are counted as cache hits. Everything lands in a small SQLite
+# file shared by the app, backfill and exporter processes, read by the ?admin=quota page.
+
+APP_DIR = Path(__file__).parent
+QUOTA_DB = APP_DIR / "history" / "sheets_calls.sqlite3"
+# Sheets read requests per minute per user - a single service account is one user
+SHEETS_READ_QUOTA_PER_MIN = int(os.environ.get("DASHBOARD_SHEETS_QUOTA", "60"))
+QUOTA_HISTORY_DAYS = 30
+
+class ApiCallLog:
+    def __init__(self, db_path=QUOTA_DB):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    # Points the log at another store - ":memory:" for benchmark and synthetic-sheet runs, so they never
+    # land in the production quota history
+    def open(self, db_path):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+            self.db_path, self.conn = db_path, None
+
+    def _db(self):
+        if self.conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS calls (ts REAL, method TEXT, target TEXT, origin TEXT, seconds REAL, error TEXT);
+                CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+                CREATE TABLE IF NOT EXISTS hits (minute INTEGER, kind TEXT, origin TEXT, n INTEGER,
+                                                 PRIMARY KEY (minute, kind, origin));
+            """)
+            cutoff = time.time() - QUOTA_HISTORY_DAYS * 86400
+            self.conn.execute("DELETE FROM calls WHERE ts < ?", (cutoff,))
+            self.conn.execute("DELETE FROM hits WHERE minute < ?", (int(cutoff // 60),))
+            self.conn.commit()
+        return self.conn
+
+    def record(self, method, target, origin, seconds, error=None):
+        with self.lock:
+            db = self._db()
+            db.execute("INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?)",
+                       (time.time(), method, target, origin or "", seconds, error))
+            db.commit()
+
+    @contextmanager
+    def call(self, method, target, origin=None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(method, target, origin, time.perf_counter() - t0, f"{type(e).__name__}: {e}"[:500])
+            raise
+        self.record(method, target, origin, time.perf_counter() - t0)
+
+    def hit(self, kind, origin=None):
+        with self.lock:
+            db = self._db()
+            db.execute("INSERT INTO hits VALUES (?, ?, ?, 1) ON CONFLICT (minute, kind, origin) DO UPDATE SET n = n + 1",
+                       (int(time.time() // 60), kind, origin or ""))
+            db.commit()
+
+    def calls(self, since):
+        with self.lock:
+            return pd.read_sql_query("SELECT * FROM calls WHERE ts >= ? ORDER BY ts", self._db(), params=(since,))
+
+    def hits(self, since):
+        with self.lock:
+            return pd.read_sql_query("SELECT * FROM hits WHERE minute >= ?", self._db(), params=(int(since // 60),))
+
+# Calls and hits per minute over [since, now], zero-filled so gaps show as gaps. Both ends come from epoch
+# seconds like the stored timestamps (naive UTC), so the range does not depend on the server's TZ.
+def per_minute(calls, hits, since):
+    index = pd.date_range(pd.Timestamp(since, unit="s").floor("min"), pd.Timestamp(time.time(), unit="s").floor("min"), freq="min")
+    call_counts = pd.to_datetime(calls["ts"], unit="s").dt.floor("min").value_counts()
+    errors = pd.to_datetime(calls.loc[calls["error"].notna(), "ts"], unit="s").dt.floor("min").value_counts()
+    hit_counts = hits.groupby(pd.to_datetime(hits["minute"] * 60, unit="s"))["n"].sum() if not hits.empty else pd.Series(dtype=int)
+    return pd.DataFrame({"calls": call_counts, "errors": errors, "hits": hit_counts}).reindex(index).fillna(0).astype(int)
+
+# Count / latency / errors per method, range and origin
+def call_breakdown(calls):
+    if calls.empty:
+        return pd.DataFrame(columns=["method", "target", "origin", "calls", "mean_ms", "p95_ms", "errors"])
+    grouped = calls.assign(ms=calls["seconds"] * 1000, failed=calls["error"].notna()).groupby(["method", "target", "origin"])
+    return grouped.agg(calls=("ms", "size"), mean_ms=("ms", "mean"), p95_ms=("ms", lambda s: s.quantile(0.95)),
+                       errors=("failed", "sum")).reset_index().sort_values("calls", ascending=False)
+
+def hit_ratio(calls, hits):
+    served = int(hits["n"].sum()) if not hits.empty else 0
+    total = served + len(calls)
+    return served / total if total else None
+
+API_CALLS = ApiCallLog()
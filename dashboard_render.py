@@ -0,0 +1,393 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.colors as pc
+import plotly.graph_objects as go
+from PIL import Image, ImageOps
+
+from dashboard_analytics import ROLLING_WINDOWS, daily_sales, month_projections, rejection_anomalies, rolling_stats
+from dashboard_timing import STAGES
+
+# Card values and Plotly figures for the dashboard grid, shared by the Streamlit app (final d.py)
+# and the static exporter.
+
+APP_DIR = Path(__file__).parent
+BG_THEMES = {"black": "black.jpg", "nature": "nature.jpg"}
+DEFAULT_THEME = "black"
+BG_SIZES = [(1280,720),(1920,1080),(2560,1440),(3840,2160)]
+BAR_COLOR_SCHEMES = {"sale": ("rgb(34,139,230)", "rgb(79,223,253)"), "sale_wokus": ("rgb(255,107,107)", "rgb(255,200,200)")}
+MAX_BARS = 31
+# Trend charts never carry more points than a card is wide in pixels; longer spans are LTTB-downsampled
+TREND_POINTS = 240
+TREND_SPANS = (1, 3, 6, 12, 24, 36)
+TREND_CHARTS = ("sale", "sale_wokus", "rej")
+
+# Utilities
+def format_inr(n):
+    try:
+        x = str(int(float(str(n).replace(",", ""))))
+    except Exception:
+        return str(n)
+    if len(x) <= 3:
+        return x
+    last3 = x[-3:]
+    rest = x[:-3]
+    rest = ''.join([rest[::-1][i:i+2][::-1]+',' for i in range(0,len(rest),2)][::-1])
+    return rest+last3
+
+def ensure_pct(x):
+    try:
+        v = float(str(x).replace("%", "").replace(",", ""))
+    except Exception:
+        return 0.0
+    return v * 100 if v <= 5 else v
+
+# Bar gradients - one palette per bar count (1-31 days) per scheme, interpolated once per process
+@lru_cache(maxsize=None)
+def bar_palettes():
+    return {
+        scheme: {n: pc.n_colors(lo, hi, max(n, 2), colortype="rgb") for n in range(1, MAX_BARS+1)}
+        for scheme, (lo, hi) in BAR_COLOR_SCHEMES.items()
+    }
+
+def bar_palette(scheme, n):
+    palettes = bar_palettes()[scheme]
+    if n not in palettes:
+        lo, hi = BAR_COLOR_SCHEMES[scheme]
+        palettes[n] = pc.n_colors(lo, hi, max(n, 2), colortype="rgb")
+    return palettes[n]
+
+# Background assets - resized WebP/JPEG variants built once per process into out_dir
+@lru_cache(maxsize=None)
+def build_background_variants(out_dir, url_prefix):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    variants = {}
+    for theme, fname in BG_THEMES.items():
+        src = APP_DIR / fname
+        if not src.exists():
+            continue
+        src_mtime = src.stat().st_mtime
+        with Image.open(src) as probe:
+            src_w, src_h = probe.size
+        img = None
+        variants[theme] = []
+        for w, h in BG_SIZES:
+            # Never upscale - a smaller source just caps the largest variant
+            if w > src_w and (w, h) != BG_SIZES[0]:
+                continue
+            stem = f"{theme}_{w}x{h}"
+            out_webp, out_jpg = out_dir / f"{stem}.webp", out_dir / f"{stem}.jpg"
+            if not (out_webp.exists() and out_jpg.exists() and out_jpg.stat().st_mtime >= src_mtime):
+                if img is None:
+                    img = Image.open(src).convert("RGB")
+                resized = ImageOps.fit(img, (min(w, src_w), min(h, src_h)), Image.LANCZOS)
+                resized.save(out_webp, "WEBP", quality=80, method=6)
+                resized.save(out_jpg, "JPEG", quality=82, optimize=True, progressive=True)
+            variants[theme].append((w, f"{url_prefix}{stem}"))
+    return variants
+
+def background_css(variants, theme):
+    variants = variants.get(theme) or variants.get(DEFAULT_THEME) or []
+    rules = []
+    for i, (w, url) in enumerate(variants):
+        rule = (f'.stApp {{background-image:url("{url}.jpg")!important;'
+                f'background-image:image-set(url("{url}.webp") type("image/webp"), url("{url}.jpg") type("image/jpeg"))!important;}}')
+        # Smallest variant is the default, each larger one kicks in once the viewport outgrows the previous
+        rules.append(rule if i == 0 else f"@media (min-width:{variants[i-1][0]+1}px) {{{rule}}}")
+    return "\n    ".join(rules)
+
+# "7d 78.1% (72.0–84.0) · 30d ..." line under a card value, as of the given day
+def rolling_line(roll_row, metric, fmt):
+    parts = []
+    for w in ROLLING_WINDOWS:
+        mean, lo, hi = (roll_row.get(f"{metric}_{w}d_{stat}") for stat in ("mean", "min", "max"))
+        if pd.notna(mean):
+            parts.append(f"{w}d {fmt(mean)} ({fmt(lo)}–{fmt(hi)})")
+    return " · ".join(parts)
+
+# Largest-Triangle-Three-Buckets: keeps first/last and, per bucket, the point forming the largest
+# triangle with the previous pick and the next bucket's mean, so peaks and dips survive the cut
+def lttb_indices(x, y, n):
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype="float64")
+    y = np.nan_to_num(np.asarray(y, dtype="float64"))
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    picked = np.empty(n, dtype=int)
+    picked[0], picked[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+# Zoom windows are only valid for the month/span they were drawn on; also the charts' uirevision
+def trend_revision(selected_month, span_months):
+    return f"{selected_month}/{span_months}"
+
+# Trend rows for the span (and zoom window, if any), cut down to TREND_POINTS. A window that misses the
+# span entirely is ignored rather than producing an empty chart.
+def trend_rows(frame, ycol, start, end, window=None):
+    if frame.empty:
+        return frame
+    if window:
+        lo, hi = max(start, pd.Timestamp(window[0])), min(end, pd.Timestamp(window[1]))
+        if lo < hi:
+            start, end = lo, hi
+    rows = frame[(frame["date"] >= start) & (frame["date"] <= end)]
+    return rows.iloc[lttb_indices(rows["date"].astype("int64").to_numpy(), rows[ycol].to_numpy(), TREND_POINTS)]
+
+def trend_xaxis(span_months):
+    if span_months == 1:
+        return dict(showgrid=False, tickfont=dict(size=10), tickangle=-45, automargin=True, tickformat="%d", dtick="D1")
+    return dict(showgrid=False, tickfont=dict(size=10), tickangle=-45, automargin=True, tickformat="%b-%y", nticks=12)
+
+def figure_json(fig):
+    fig_json = json.loads(fig.to_json())
+    return {"data": fig_json.get("data", []), "layout": fig_json.get("layout", {})}
+
+# Function to render dashboard
+def build_grid_state(data, selected_month, span_months=1, zoom=None):
+    clock = STAGES.clock("render")
+    df, sale_df, rej_df, wokus_sale_df = data.df, data.sale_df, data.rej_df, data.wokus_sale_df
+    month_targets, cols = data.month_targets, data.cols
+    date_col, today_col, oee_col, rej_day_col, rej_pct_col = cols["date"], cols["today"], cols["oee"], cols["rej_day"], cols["rej_pct"]
+    rej_cum_col, total_cum_col, copq_col, copq_cum_col = cols["rej_cum"], cols["total_cum"], cols["copq"], cols["copq_cum"]
+
+    selected_month_dt = pd.to_datetime(selected_month, format="%b-%Y")
+    month_num = selected_month_dt.month
+    year_num = selected_month_dt.year
+
+    # Filter data for the selected month
+    df_filtered = df[(df[date_col].dt.month==month_num) & (df[date_col].dt.year==year_num)]
+    month_period = pd.Period(selected_month_dt, "M")
+    sale_days, wokus_days = daily_sales(data), daily_sales(data, "W/O KUS")
+    sale_days = sale_days[sale_days.index.asfreq("M") == month_period]
+    wokus_days = wokus_days[wokus_days.index.asfreq("M") == month_period]
+
+    # Trend charts cover span_months ending with the selected month; zoom holds the x window per chart
+    zoom = zoom or {}
+    trend_end = selected_month_dt + pd.offsets.MonthEnd(0)
+    trend_start = selected_month_dt - pd.DateOffset(months=span_months - 1)
+    sale_trend = trend_rows(sale_df, "sale amount", trend_start, trend_end, zoom.get("sale"))
+    wokus_trend = trend_rows(wokus_sale_df, "sale amount", trend_start, trend_end, zoom.get("sale_wokus"))
+    rej_trend = trend_rows(rej_df, "rej amt", trend_start, trend_end, zoom.get("rej"))
+    revision = trend_revision(selected_month, span_months)
+    clock.lap("filter")
+
+    if not df_filtered.empty:
+        latest = df_filtered.iloc[-1]
+        today_sale = latest[today_col]
+        oee = ensure_pct(latest[oee_col])
+        rej_day_amount = latest[rej_day_col]
+        rej_pct = ensure_pct(latest[rej_pct_col])
+        rej_cum_val = df_filtered[rej_cum_col].dropna().iloc[-1] if not df_filtered[rej_cum_col].dropna().empty else 0
+        total_cum_val = df_filtered[total_cum_col].dropna().iloc[-1] if not df_filtered[total_cum_col].dropna().empty else 0
+        copq_display = format_inr(latest[copq_col]) if copq_col and pd.notna(latest[copq_col]) else "..."
+        copq_cum_display = format_inr(latest[copq_cum_col]) if copq_cum_col and pd.notna(latest[copq_cum_col]) else "..."
+        roll = rolling_stats(data)
+        roll_row = roll.loc[latest[date_col]] if latest[date_col] in roll.index else {}
+    else:
+        today_sale=oee=rej_day_amount=rej_pct=rej_cum_val=total_cum_val=0
+        copq_display=copq_cum_display="..."
+        roll_row = {}
+
+    total_sales_filtered = sale_days.sum()
+    target_sale = month_targets.get(selected_month, 1)
+    if target_sale <= 0:
+        target_sale = 1
+    achieved_pct_val = round(total_sales_filtered / target_sale * 100, 2)
+    projections = month_projections(data)
+    projection = projections.loc[selected_month] if selected_month in projections.index else None
+    clock.lap("kpis")
+
+    # Sale Trend Graph WITH KUS
+    bar_gradients = bar_palette("sale", len(sale_trend))
+    fig_sale = go.Figure()
+    fig_sale.add_trace(go.Bar(
+        x=sale_trend["date"],
+        y=sale_trend["sale amount"]/100000.0,
+        marker_color=bar_gradients,
+        marker_line_width=0,
+        opacity=0.97,
+        name="With KUS",
+        hovertemplate="Date: %{x|%d-%b}<br>Sale: %{y:.2f} Lakh<extra></extra>"
+    ))
+    fig_sale.update_layout(
+        margin=dict(t=5,b=30,l=10,r=10),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        height=105,
+        xaxis=trend_xaxis(span_months),
+        uirevision=revision,
+        yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="Lakh")
+    )
+
+    # Sale Trend Graph W/O KUS (exactly same style)
+    fig_sale_wokus = go.Figure()
+    if not wokus_trend.empty:
+        bar_gradients_wokus = bar_palette("sale_wokus", len(wokus_trend))
+        fig_sale_wokus.add_trace(go.Bar(
+            x=wokus_trend["date"],
+            y=wokus_trend["sale amount"]/100000.0,
+            marker_color=bar_gradients_wokus,
+            marker_line_width=0,
+            opacity=0.97,
+            name="W/O KUS",
+            hovertemplate="Date: %{x|%d-%b}<br>Sale: %{y:.2f} Lakh<extra></extra>"
+        ))
+        fig_sale_wokus.update_layout(
+            margin=dict(t=5,b=30,l=10,r=10),
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            height=105,
+            xaxis=trend_xaxis(span_months),
+            uirevision=revision,
+            yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="Lakh")
+        )
+    else:
+        fig_sale_wokus.update_layout(
+            margin=dict(t=5,b=30,l=10,r=10),
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            height=105,
+            xaxis=dict(showgrid=False),
+            yaxis=dict(showgrid=False)
+        )
+
+    # Rejection Trend Graph
+    rej_lakh = rej_trend["rej amt"]/1000.0
+    fig_rej = go.Figure()
+    fig_rej.add_trace(go.Scatter(
+        x=rej_trend["date"],
+        y=rej_lakh,
+        mode="lines+markers",
+        marker=dict(size=8, color="#fc7d1b", line=dict(width=1.5, color="#fff")),
+        line=dict(width=5, color="#fc7d1b", shape="spline"),
+        hoverinfo="x+y",
+        opacity=1,
+        hovertemplate="Date: %{x|%d-%b}<br>Rejection: %{y:.2f} K<extra></extra>"
+    ))
+    fig_rej.add_trace(go.Scatter(
+        x=rej_trend["date"],
+        y=rej_lakh,
+        mode="lines",
+        line=dict(width=15, color="rgba(252,125,27,0.13)", shape="spline"),
+        hoverinfo="skip",
+        opacity=1
+    ))
+    # Days outside the EWMA band get a red marker
+    anomalies = rejection_anomalies(data)
+    month_anomalies = anomalies[(anomalies.index.month==month_num) & (anomalies.index.year==year_num) & anomalies["anomaly"]]
+    trend_anomalies = anomalies[anomalies["anomaly"]]
+    if not rej_trend.empty:
+        trend_anomalies = trend_anomalies[(trend_anomalies.index >= rej_trend["date"].iloc[0]) & (trend_anomalies.index <= rej_trend["date"].iloc[-1])]
+    if not trend_anomalies.empty:
+        fig_rej.add_trace(go.Scatter(
+            x=trend_anomalies.index,
+            y=trend_anomalies["amount"]/1000.0,
+            mode="markers",
+            marker=dict(size=13, color="rgba(0,0,0,0)", line=dict(width=2.5, color="#ff2d2d")),
+            hovertemplate="Date: %{x|%d-%b}<br>Spike: %{y:.2f} K (z=%{customdata:.1f})<extra></extra>",
+            customdata=trend_anomalies["z"]
+        ))
+    fig_rej.update_layout(
+        margin=dict(t=5,b=30,l=10,r=10),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        height=105,
+        showlegend=False,
+        xaxis=trend_xaxis(span_months),
+        uirevision=revision,
+        yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="K")
+    )
+
+    # Speedometer Gauge
+    GREEN="#009e4f"
+    gauge = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=achieved_pct_val,
+        number={"suffix":"%", "font":{"size":36, "color":GREEN, "family":"Poppins","weight":"bold"}},
+        domain={"x":[0,1],"y":[0,1]},
+        gauge={
+            "shape":"angular",
+            "axis":{"range":[0,100],"tickvals":[0,25,50,75,100],"ticktext":["0%","25%","50%","75%","100%"]},
+            "bar":{"color":GREEN, "thickness":0.35},
+            "bgcolor":"rgba(0,0,0,0)",
+            "steps":[{"range":[0,60],"color":"#c4eed1"},{"range":[60,85],"color":"#7ee2b7"},{"range":[85,100],"color":GREEN}],
+            # Threshold marks where the month lands at the current run-rate
+            "threshold":{"line":{"color":"#111","width":4},
+                         "value":min(projection["projected_pct"], 100) if projection is not None and pd.notna(projection["projected_pct"]) else achieved_pct_val}
+        }
+    ))
+    gauge.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", margin=dict(t=5,b=5,l=5,r=5), height=130)
+    clock.lap("figures")
+
+    # Dashboard values
+    top_today_sale = format_inr(today_sale)
+    top_oee = f"{round(oee if pd.notna(oee) else 0,1)}%"
+    left_rej_amt = format_inr(rej_day_amount)
+    left_rej_pct = f"{rej_pct:.1f}%"
+    bottom_rej_cum = format_inr(rej_cum_val)
+    total_cum_disp = format_inr(total_cum_val)
+    inventory_val = data.cells["K2"]
+    inventory_disp = format_inr(inventory_val) if inventory_val else "0"
+    
+    # W/O KUS latest-day and month-to-date sale for the selected month
+    yesterday_sale_wokus_disp = format_inr(wokus_days.iloc[-1]) if not wokus_days.empty else "0"
+    cum_sale_wokus_disp = format_inr(wokus_days.sum()) if not wokus_days.empty else "0"
+
+    if month_anomalies.empty:
+        rej_spike_disp = "No spikes this month"
+    else:
+        last_spike = month_anomalies.iloc[-1]
+        rej_spike_disp = (f"⚠ {len(month_anomalies)} spike{'s' if len(month_anomalies) > 1 else ''} this month, "
+                          f"latest {month_anomalies.index[-1]:%d-%b} (z={last_spike['z']:.1f})")
+
+    if projection is not None and pd.notna(projection["projected_pct"]):
+        projected_disp = f"{projection['projected_pct']:.1f}%"
+        if projection["remaining_days"] > 0:
+            required_disp = f"Need ₹ {format_inr(projection['required_daily'])}/day for {int(projection['remaining_days'])} working days"
+        else:
+            required_disp = f"Run-rate ₹ {format_inr(projection['run_rate'])}/day"
+    else:
+        projected_disp, required_disp = "...", ""
+    clock.lap("values")
+
+    charts = {
+        "sale": figure_json(fig_sale),
+        "sale_wokus": figure_json(fig_sale_wokus),
+        "rej": figure_json(fig_rej),
+        "gauge": figure_json(gauge),
+    }
+    clock.lap("serialize")
+    return {
+        "values": {
+            "today_sale": top_today_sale,
+            "yesterday_sale_wokus": yesterday_sale_wokus_disp,
+            "rej_amt": left_rej_amt,
+            "oee": top_oee,
+            "cum_sale": total_cum_disp,
+            "cum_sale_wokus": cum_sale_wokus_disp,
+            "rej_pct": left_rej_pct,
+            "copq": copq_display,
+            "copq_cum": copq_cum_display,
+            "inventory": inventory_disp,
+            "rej_cum": bottom_rej_cum,
+            "oee_roll": rolling_line(roll_row, "oee", lambda v: f"{v:.1f}%"),
+            "rej_pct_roll": rolling_line(roll_row, "rej_pct", lambda v: f"{v:.1f}%"),
+            "copq_roll": rolling_line(roll_row, "copq", format_inr),
+            "rej_spikes": rej_spike_disp,
+            "projected_pct": projected_disp,
+            "required_daily": required_disp,
+        },
+        "charts": charts,
+    }
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Per-stage wall-clock timings. Every phase (auth, get_values, parse, analytics, month filter, figure
+# building, serialization, grid diff, iframe apply) records into one process-wide rolling window per
+# stage, read by the ?timing=1 overlay and the refresher's log line.
+TIMING_WINDOW = 200
+TIMING_LOG_EVERY_S = 300
+
+class StageLog:
+    def __init__(self, window=TIMING_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.last_logged = 0.0
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def clock(self, prefix):
+        return LapClock(self, prefix)
+
+    # {stage: {"n", "last_ms", "p50_ms", "p95_ms"}} over the rolling window
+    def summary(self):
+        with self.lock:
+            samples = {name: np.array(s) * 1000 for name, s in self.samples.items()}
+        return {name: {"n": len(s), "last_ms": s[-1], "p50_ms": np.percentile(s, 50), "p95_ms": np.percentile(s, 95)}
+                for name, s in sorted(samples.items())}
+
+    def log_line(self):
+        return "Stage ms p50/p95: " + ", ".join(f"{name} {v['p50_ms']:.0f}/{v['p95_ms']:.0f}"
+                                                for name, v in self.summary().items())
+
+    # Prints the rolling percentiles at most every TIMING_LOG_EVERY_S seconds
+    def maybe_log(self):
+        now = time.time()
+        if now - self.last_logged >= TIMING_LOG_EVERY_S:
+            self.last_logged = now
+            print(self.log_line())
+
+# Consecutive phases of one function - each lap() records the time since the previous lap as prefix:name
+class LapClock:
+    def __init__(self, log, prefix):
+        self.log, self.prefix = log, prefix
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.log.record(f"{self.prefix}:{name}", now - self.last)
+        self.last = now
+
+STAGES = StageLog()
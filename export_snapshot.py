@@ -0,0 +1,109 @@
+# Static snapshot export for TV screens - renders the same card grid as the dashboard into one
+# self-contained HTML file per plant (Plotly and background inlined) on a schedule. TVs load the file
+# from any static server (or --serve) and reload it themselves, so no Streamlit session is held open.
+#   python export_snapshot.py [--plant main] [--month Feb-2026] [--every 300] [--serve 8080] [--out export]
+import argparse
+import base64
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from dashboard_data import DataLoadError, authorize, fetch_raw, load_creds_info, parse_data, read_plants
+from dashboard_render import BG_SIZES, DEFAULT_THEME, build_background_variants, build_grid_state
+
+APP_DIR = Path(__file__).parent
+PLANTS_CONFIG = APP_DIR / "plants.toml"
+GRID_TEMPLATE = APP_DIR / "components" / "dashboard_grid" / "index.html"
+BG_DIR = APP_DIR / "static" / "bg"
+
+def background_data_uri(theme, width):
+    variants = build_background_variants(BG_DIR, "")
+    variants = variants.get(theme) or variants.get(DEFAULT_THEME) or []
+    if not variants:
+        return ""
+    # Smallest variant that still covers the screen width, else the largest there is
+    stem = next((stem for w, stem in variants if w >= width), variants[-1][1])
+    return "data:image/webp;base64," + base64.b64encode((BG_DIR / f"{stem}.webp").read_bytes()).decode()
+
+# The grid component's own page, fed the full state once instead of Streamlit render messages
+def render_static_html(state, bg_uri, refresh_s, plotly_js):
+    page = GRID_TEMPLATE.read_text(encoding="utf-8")
+    head = f'<meta http-equiv="refresh" content="{refresh_s}">' if refresh_s else ""
+    if bg_uri:
+        head += f'<style>html {{background:url("{bg_uri}") center center / cover no-repeat fixed;}}</style>'
+    head += f"<script>{plotly_js}</script>"
+    args = {"version": 1, "base": 0, "delta": state, "plotly_src": ""}
+    boot = ('<script>window.postMessage({type: "streamlit:render", args: '
+            + json.dumps(args).replace("</", "<\\/") + '}, "*");</script>')
+    return page.replace("</head>", head + "</head>", 1).replace("</body>", boot + "</body>", 1)
+
+def write_atomic(path, text):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+
+def export_once(plants, sources, pool, args, plotly_js, last_versions):
+    for plant_id, (dash_ws, sr_ws) in sources.items():
+        try:
+            raw = fetch_raw(dash_ws, sr_ws, pool, origin=f"export:{plant_id}")
+        except DataLoadError as e:
+            print(f"{plant_id}: {e}")
+            continue
+        out_path = args.out / f"{plant_id}.html"
+        if last_versions.get(plant_id) == raw["version"] and out_path.exists():
+            continue
+        snapshot = parse_data(raw)
+        months = sorted(snapshot.month_targets, key=lambda m: pd.to_datetime(m, format="%b-%Y"))
+        month = args.month or (months[-1] if months else pd.Timestamp.today().strftime("%b-%Y"))
+        state = build_grid_state(snapshot, month)
+        html = render_static_html(state, background_data_uri(args.theme, args.width), args.every, plotly_js)
+        write_atomic(out_path, html)
+        if plant_id == next(iter(plants)):
+            write_atomic(args.out / "index.html", html)
+        last_versions[plant_id] = raw["version"]
+        print(f"{plant_id}: wrote {out_path} ({len(html)//1024} KB, data {raw['version']}, {month})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the dashboard grid to static HTML for TV screens")
+    parser.add_argument("--plant", action="append", help="plant id from plants.toml (default: all)")
+    parser.add_argument("--month", help="month to show, e.g. Feb-2026 (default: latest target month)")
+    parser.add_argument("--every", type=int, default=300, help="seconds between exports, 0 to export once")
+    parser.add_argument("--out", type=Path, default=APP_DIR / "export")
+    parser.add_argument("--theme", default=DEFAULT_THEME)
+    parser.add_argument("--width", type=int, default=BG_SIZES[1][0], help="TV width in px, picks the background size")
+    parser.add_argument("--serve", type=int, default=0, help="also serve --out on this port")
+    parser.add_argument("--credentials", help="service account JSON (default: .streamlit/secrets.toml)")
+    args = parser.parse_args()
+
+    plants = read_plants(PLANTS_CONFIG)
+    plants = {pid: plants[pid] for pid in (args.plant or plants) if pid in plants}
+    if not plants:
+        parser.error("no matching plants in plants.toml")
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    client = authorize(load_creds_info(args.credentials))
+    sources = {}
+    for plant_id, plant in plants.items():
+        sh = client.open_by_key(plant["spreadsheet_id"])
+        sources[plant_id] = (sh.worksheet(plant["dashboard_sheet"]), sh.worksheet(plant["sales_report_sheet"]))
+    pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="export-fetch")
+    plotly_js = get_plotlyjs()
+
+    if args.serve:
+        server = ThreadingHTTPServer(("0.0.0.0", args.serve), partial(SimpleHTTPRequestHandler, directory=str(args.out)))
+        threading.Thread(target=server.serve_forever, name="export-server", daemon=True).start()
+        print(f"Serving {args.out} on port {args.serve}")
+
+    last_versions = {}
+    while True:
+        export_once(plants, sources, pool, args, plotly_js, last_versions)
+        if not args.every:
+            break
+        time.sleep(args.every)
@@ -1,333 +1,359 @@
 import streamlit as st
 import pandas as pd
+from plotly.offline import get_plotlyjs_version
+import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import plotly.graph_objects as go
-import plotly.colors as pc
-import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-import gspread
-from google.oauth2.service_account import Credentials
+from urllib.parse import parse_qs, unquote, urlsplit
+from dashboard_data import DataLoadError, authorize, drill_rows, fetch_raw, parse_data, read_plants
+from dashboard_analytics import (COMPARISONS, EXPORT_DATASETS, comparison_view, daily_series, export_bytes,
+                                 export_format, export_frame, export_months, month_kpis, month_projections,
+                                 monthly_records, update_rejection_anomalies, update_rolling)
+from dashboard_render import (DEFAULT_THEME, TREND_SPANS, background_css, build_background_variants, build_grid_state,
+                              trend_revision)
+from dashboard_timing import STAGES
+from dashboard_quota import API_CALLS, SHEETS_READ_QUOTA_PER_MIN, call_breakdown, hit_ratio, per_minute
+from dashboard_memory import MEMORY, MEMORY_LIMIT_MB, MEMORY_PROFILE, RENDERS
 
 st.set_page_config(page_title="Factory Dashboard (Exact Layout)", layout="wide")
 
-IMAGE_PATH = "black.jpg"
-SPREADSHEET_ID = "168UoOWdTfOBxBvy_4QGymfiIRimSO2OoJdnzBDRPLvk"
-DASHBOARD_SHEET = "Dashboard"
-SALES_REPORT_SHEET = "Sales Report"
+APP_DIR = Path(__file__).parent
+BG_STATIC_DIR = APP_DIR / "static" / "bg"
+KIOSK_REFRESH_S = 300
+# Optional change-notification endpoint; with it on, Sheets is only re-read on a notification (or the fallback TTL)
+WEBHOOK_PORT = int(os.environ.get("DASHBOARD_WEBHOOK_PORT", "0"))
+WEBHOOK_TOKEN = os.environ.get("DASHBOARD_WEBHOOK_TOKEN", "")
+PUSH_CHECK_S = 5
+# onEdit fires per cell edit - webhook-triggered re-reads of a plant are at least this far apart
+WEBHOOK_MIN_INTERVAL_S = 15
+# Optional read-only JSON KPI API for MES and other screens, answered from the refreshers' snapshots.
+# Streamlit only runs this script for a browser session, so the refreshers, webhook and API all start on
+# the first page load after the server starts - open the dashboard once (or keep a kiosk on it) after a restart.
+API_PORT = int(os.environ.get("DASHBOARD_API_PORT", "0"))
+API_TOKEN = os.environ.get("DASHBOARD_API_TOKEN", "")
+DATA_TTL = 3600 if WEBHOOK_PORT else 60
+# A failed load is retried after 5 s, doubling per consecutive failure up to RETRY_MAX_S (never past DATA_TTL)
+RETRY_FIRST_S = 5
+RETRY_MAX_S = 300
+FIRST_LOAD_TIMEOUT_S = 60
+FETCH_WORKERS = 4
+# One process serves every plant listed here (see plants.example.toml); without it, the single sheet above
+PLANTS_CONFIG = APP_DIR / "plants.toml"
+
+# Plants - each gets its own refresher thread and snapshot partition, the libraries and client are shared
+@st.cache_resource
+def load_plants():
+    return read_plants(PLANTS_CONFIG)
+
+# Change notifications - POST /notify wakes the background refresher so it re-reads Sheets straight away.
+# Apps Script trigger (Extensions > Apps Script, add an installable onEdit trigger):
+#   function onEdit(e) {
+#     UrlFetchApp.fetch("https://<host>:<port>/notify", {method: "post", contentType: "application/json",
+#       headers: {"X-Dashboard-Token": "<token>"},
+#       payload: JSON.stringify({spreadsheet_id: e.source.getId(), sheet: e.range.getSheet().getName()})});
+#   }
+# A notification naming a plant or spreadsheet_id wakes only that plant, otherwise every plant refreshes.
+# Locally: python notify_change.py --port <port> --token <token>
+@st.cache_resource
+def change_feed():
+    return {"generation": 0, "last_notified": None, "lock": threading.Lock(), "wakes": {}}
+
+# URL-decoded query string, last value wins for a repeated key
+def query_params(query):
+    return {k: v[-1] for k, v in parse_qs(query).items()}
+
+@st.cache_resource
+def start_webhook_server(port, token):
+    feed = change_feed()
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != "/notify":
+                return self._reply(404, {"error": "not found"})
+            if token and token not in (self.headers.get("X-Dashboard-Token"), query_params(url.query).get("token")):
+                return self._reply(403, {"error": "bad token"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                return self._reply(400, {"error": "bad Content-Length"})
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except Exception:
+                payload = {}
+            # Anything but a JSON object is a bare "something changed" - refresh every plant
+            if not isinstance(payload, dict):
+                payload = {}
+            plants = load_plants()
+            targets = [pid for pid, p in plants.items()
+                       if payload.get("plant") == pid or payload.get("spreadsheet_id") == p["spreadsheet_id"]] or list(plants)
+            with feed["lock"]:
+                feed["generation"] += 1
+                feed["last_notified"] = (time.time(), payload.get("sheet", ""), targets)
+                generation = feed["generation"]
+                wakes = [feed["wakes"][pid] for pid in targets if pid in feed["wakes"]]
+            for wake in wakes:
+                wake.set()
+            self._reply(202, {"generation": generation, "plants": targets})
+
+        def log_message(self, *args):
+            pass
 
-# Utilities
-def load_image_base64(path: str) -> str:
     try:
-        data = Path(path).read_bytes()
-        return base64.b64encode(data).decode()
-    except Exception:
-        return ""
-
-def format_inr(n):
+        server = ThreadingHTTPServer(("0.0.0.0", port), WebhookHandler)
+    except OSError as e:
+        print(f"Webhook endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="dashboard-webhook", daemon=True).start()
+    return server
+
+# Google Sheets Auth - client, spreadsheet and worksheet handles are shared by every session and rerun
+@st.cache_resource
+def get_client():
     try:
-        x = str(int(float(str(n).replace(",", ""))))
-    except Exception:
-        return str(n)
-    if len(x) <= 3:
-        return x
-    last3 = x[-3:]
-    rest = x[:-3]
-    rest = ''.join([rest[::-1][i:i+2][::-1]+',' for i in range(0,len(rest),2)][::-1])
-    return rest+last3
-
-def ensure_pct(x):
+        creds_info = st.secrets["gcp_service_account"]
+    except Exception as e:
+        raise DataLoadError(f"Google auth failed: {e}")
+    with STAGES.stage("auth"):
+        return authorize(creds_info)
+
+@st.cache_resource
+def get_spreadsheet(spreadsheet_id):
+    try:
+        with API_CALLS.call("spreadsheets.get", spreadsheet_id, session_origin()):
+            return get_client().open_by_key(spreadsheet_id)
+    except Exception as e:
+        raise DataLoadError(f"Cannot open spreadsheet: {e}")
+
+@st.cache_resource
+def get_worksheet(spreadsheet_id, name):
+    spreadsheet = get_spreadsheet(spreadsheet_id)
+    try:
+        with API_CALLS.call("spreadsheets.get", f"{spreadsheet_id}/{name}", session_origin()):
+            return spreadsheet.worksheet(name)
+    except Exception as e:
+        raise DataLoadError(f"Cannot read {name} sheet: {e}")
+
+# Who triggered a Sheets call or snapshot read, for the quota page
+def session_origin():
+    ctx = get_script_run_ctx()
+    return f"session:{ctx.session_id[:8]}" if ctx else "server"
+
+# Background refresher - loads, parses and swaps in a new Snapshot off the script thread.
+# Sessions only ever read store["snapshot"]; they block just once, before the very first load completes.
+@st.cache_resource
+def start_refresher(plant_id):
+    plant = load_plants()[plant_id]
+    feed = change_feed()
+    store = {"snapshot": None, "error": None, "ready": threading.Event()}
+    dash_ws = get_worksheet(plant["spreadsheet_id"], plant["dashboard_sheet"])
     try:
-        v = float(str(x).replace("%", "").replace(",", ""))
+        sr_ws = get_worksheet(plant["spreadsheet_id"], plant["sales_report_sheet"])
     except Exception:
-        return 0.0
-    return v * 100 if v <= 5 else v
-
-def find_col(df, target):
-    norm_target = target.lower().replace(" ", "").replace("%", "").replace("(", "").replace(")", "")
-    for c in df.columns:
-        norm_c = str(c).lower().replace(" ", "").replace("%", "").replace("(", "").replace(")", "")
-        if norm_c == norm_target:
-            return c
-    return None
-
-# Google Sheets Auth
-try:
-    creds_info = st.secrets["gcp_service_account"]
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets","https://www.googleapis.com/auth/drive"]
-    creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-    client = gspread.authorize(creds)
-except Exception as e:
-    st.error(f"Google auth failed: {e}")
-    st.stop()
-
-# Open sheet
-try:
-    sh = client.open_by_key(SPREADSHEET_ID)
-except Exception as e:
-    st.error(f"Cannot open spreadsheet: {e}")
-    st.stop()
-
-# Dashboard sheet
-try:
-    dash_ws = sh.worksheet(DASHBOARD_SHEET)
-    rows = dash_ws.get_values()
-except Exception as e:
-    st.error(f"Cannot read Dashboard sheet: {e}")
-    st.stop()
-
-if not rows or len(rows)<2:
-    st.error("Dashboard sheet has no data.")
-    st.stop()
-
-# Prepare dataframe
-header = rows[0]
-data_rows = [r for r in rows[1:] if any(r)]
-dash_data = [dict(zip(header,r)) for r in data_rows]
-df = pd.DataFrame(dash_data)
-df.columns = df.columns.astype(str)
-
-date_col = find_col(df,"date")
-today_col = find_col(df,"today's sale") or find_col(df,"todays sale")
-oee_col = find_col(df,"oee %") or find_col(df,"oee")
-plan_col = find_col(df,"plan vs actual %")
-rej_day_col = find_col(df,"rejection amount (daybefore)") or find_col(df,"rejection amount daybefore")
-rej_pct_col = find_col(df,"rejection %") or find_col(df,"rejection")
-rej_cum_col = find_col(df,"rejection amount (cumulative)") or find_col(df,"rejection amount cumulative")
-total_cum_col = find_col(df,"total sales (cumulative)") or find_col(df,"total sales cumulative")
-copq_col = find_col(df,"copq")
-copq_cum_col = find_col(df,"copq cumulative") or find_col(df,"copqcumulative")
-
-if not all([date_col, today_col, oee_col, plan_col, rej_day_col, rej_pct_col, rej_cum_col, total_cum_col]):
-    st.error("Required dashboard columns missing")
-    st.stop()
-
-df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-for c in df.columns:
-    if c != date_col:
-        df[c] = pd.to_numeric(df[c].astype(str).str.replace(",", ""), errors="coerce")
-df = df.dropna(subset=[date_col]).sort_values(date_col)
-
-# Sales report sheet - WITH KUS (existing)
-try:
-    sr_ws = sh.worksheet(SALES_REPORT_SHEET)
-    sr_rows = sr_ws.get_values()
-except Exception:
-    sr_rows = []
-
-sale_records, rej_records = [], []
-if sr_rows and len(sr_rows)>1:
-    for r in sr_rows[1:]:
-        if len(r)>=3:
-            date_str = (r[0] or "").strip()
-            sales_type = (r[1] or "").strip().upper()
-            sale_amt = r[2]
-            if date_str and sales_type=="OEE":
-                sale_records.append({"date": date_str,"sale amount":sale_amt})
-        if len(r)>=12:
-            rej_date_str = (r[10] or "").strip()
-            rej_amt = r[11]
-            if rej_date_str and rej_amt not in (None,""):
-                rej_records.append({"date":rej_date_str,"rej amt":rej_amt})
-
-sale_df = pd.DataFrame(sale_records) if sale_records else pd.DataFrame({"date":df[date_col],"sale amount":df[today_col]})
-rej_df = pd.DataFrame(rej_records) if rej_records else pd.DataFrame({"date":df[date_col],"rej amt":df[rej_day_col]})
-
-sale_df["date"] = pd.to_datetime(sale_df["date"], errors="coerce")
-sale_df["sale amount"] = pd.to_numeric(sale_df["sale amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
-sale_df = sale_df.dropna(subset=["date"]).sort_values("date")
-
-rej_df["date"] = pd.to_datetime(rej_df["date"], errors="coerce")
-rej_df["rej amt"] = pd.to_numeric(rej_df["rej amt"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
-rej_df = rej_df.dropna(subset=["date"]).sort_values("date")
-
-# FIXED: Sales report sheet - W/O KUS (Q1=Date, S1=Sale Amount, S2 onwards values only)
-wokus_sale_records = []
-if sr_rows and len(sr_rows)>1:
-    for r in sr_rows[1:]:  # Start from row 2 (data rows)
-        if len(r) > 18:  # Ensure we have S column (index 18)
-            date_str = (r[16] or "").strip()  # Q column (Date) - index 16 (17th column)
-            sale_amt = r[18]  # S column (Sale Amount) - index 18 (19th column)
-            if date_str and sale_amt not in (None, "", 0):  # Only take rows with date AND sale amount
-                wokus_sale_records.append({"date": date_str, "sale amount": sale_amt})
-
-wokus_sale_df = pd.DataFrame(wokus_sale_records)
-if not wokus_sale_df.empty:
-    wokus_sale_df["date"] = pd.to_datetime(wokus_sale_df["date"], errors="coerce")
-    wokus_sale_df["sale amount"] = pd.to_numeric(wokus_sale_df["sale amount"].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
-    wokus_sale_df = wokus_sale_df.dropna(subset=["date"]).sort_values("date")
-else:
-    wokus_sale_df = pd.DataFrame({"date": [], "sale amount": []})
-
-# Monthly targets (UPDATED for Feb-2026 - now reading A11:B14)
-month_targets_vals = dash_ws.get_values('A11:B14')
-month_targets = {}
-for row in month_targets_vals:
-    if len(row)>=2 and row[0].strip() and row[1].strip():
+        sr_ws = None
+
+    pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix=f"dashboard-fetch-{plant_id}")
+    with feed["lock"]:
+        wake = feed["wakes"].setdefault(plant_id, threading.Event())
+    reason = f"start:{session_origin()}"
+
+    def refresh_loop():
+        nonlocal reason
+        failures = 0
+        while True:
+            fetched_at = time.monotonic()
+            try:
+                raw = fetch_raw(dash_ws, sr_ws, pool, origin=f"refresher:{plant_id}:{reason}")
+                current = store["snapshot"]
+                if current is None or current.version != raw["version"]:
+                    with STAGES.stage("parse"):
+                        snapshot = parse_data(raw)
+                    # Rolling stats carry over from the previous snapshot, only new/changed days are recomputed
+                    with STAGES.stage("analytics"):
+                        update_rolling(snapshot, current)
+                        month_projections(snapshot)
+                        update_rejection_anomalies(snapshot, current)
+                    store["snapshot"] = snapshot
+                    MEMORY.note_snapshot(plant_id, snapshot, raw)
+                    MEMORY.check(RENDERS)
+                store["error"] = None
+                failures = 0
+            except Exception as e:
+                store["error"] = str(e)
+                failures += 1
+            store["ready"].set()
+            STAGES.maybe_log()
+            wait_s = min(RETRY_FIRST_S * 2 ** (failures - 1), RETRY_MAX_S, DATA_TTL) if failures else DATA_TTL
+            # A webhook notification cuts the wait short; notifications inside WEBHOOK_MIN_INTERVAL_S of the
+            # last fetch are held back and served by one re-read
+            reason = "webhook" if wake.wait(wait_s) else ("retry" if failures else "ttl")
+            if reason == "webhook":
+                time.sleep(max(0.0, fetched_at + WEBHOOK_MIN_INTERVAL_S - time.monotonic()))
+            wake.clear()
+
+    threading.Thread(target=refresh_loop, name=f"dashboard-refresher-{plant_id}", daemon=True).start()
+    return store
+
+# Every plant's refresher is started together so their fetches run in parallel from the first page load
+def start_all_refreshers():
+    for plant_id in load_plants():
         try:
-            month_dt = pd.to_datetime(row[0], format="%b-%Y")
-            month_targets[month_dt.strftime("%b-%Y")] = float(row[1].replace(",", ""))
-        except Exception:
-            continue
+            start_refresher(plant_id)
+        except DataLoadError:
+            pass
+
+def load_data(plant_id):
+    store = start_refresher(plant_id)
+    store["ready"].wait(FIRST_LOAD_TIMEOUT_S)
+    snapshot = store["snapshot"]
+    if snapshot is None:
+        raise DataLoadError(store["error"] or "Dashboard data is still loading, please retry.")
+    API_CALLS.hit("snapshot", session_origin())
+    return snapshot
+
+# KPI API - GET /api/plants, /api/<plant>/kpis?month=Feb-2026, /api/<plant>/monthly, /api/<plant>/daily?start=&end=.
+# The ETag is the snapshot version plus the request path, so a poller's If-None-Match is answered with a
+# 304 before any payload is built; bodies only change when the refresher swaps in new data.
+@st.cache_resource
+def start_api_server(port, token):
+    class ApiHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, payload=None, etag=None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(code)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            if code != 304:
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _snapshot(self, plant_id):
+            try:
+                return start_refresher(plant_id)["snapshot"]
+            except DataLoadError:
+                return None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            path, params = unquote(url.path), query_params(url.query)
+            if token and token not in (self.headers.get("X-Dashboard-Token"), params.get("token")):
+                return self._reply(403, {"error": "bad token"})
+            parts = path.strip("/").split("/")
+            if parts[0] != "api" or len(parts) not in (2, 3):
+                return self._reply(404, {"error": "not found"})
+            plants = load_plants()
+            if parts[1] == "plants" and len(parts) == 2:
+                snapshots = {pid: self._snapshot(pid) for pid in plants}
+                version = ",".join(s.version if s else "-" for s in snapshots.values())
+                build = lambda: [{"id": pid, "name": plants[pid]["name"], "version": s.version if s else None,
+                                  "loaded_at": s.loaded_at if s else None} for pid, s in snapshots.items()]
+            elif len(parts) == 3 and parts[1] in plants and parts[2] in ("kpis", "monthly", "daily"):
+                snapshot = self._snapshot(parts[1])
+                if snapshot is None:
+                    return self._reply(503, {"error": "data is not loaded yet"})
+                version = snapshot.version
+                if parts[2] == "kpis":
+                    months = sorted(snapshot.month_targets, key=lambda m: pd.to_datetime(m, format="%b-%Y"))
+                    month = params.get("month") or (months[-1] if months else pd.Timestamp.today().strftime("%b-%Y"))
+                    build = lambda: month_kpis(snapshot, month)
+                elif parts[2] == "monthly":
+                    build = lambda: monthly_records(snapshot)
+                else:
+                    build = lambda: daily_series(snapshot, params.get("start"), params.get("end"))
+            else:
+                return self._reply(404, {"error": "not found"})
+            etag = '"' + hashlib.sha1(f"{version}|{self.path}".encode()).hexdigest()[:20] + '"'
+            if etag in (t.strip() for t in self.headers.get("If-None-Match", "").split(",")):
+                API_CALLS.hit("snapshot", "api")
+                return self._reply(304, etag=etag)
+            try:
+                payload = build()
+            except (ValueError, KeyError) as e:
+                return self._reply(400, {"error": str(e).splitlines()[0]})
+            API_CALLS.hit("snapshot", "api")
+            self._reply(200, payload, etag)
+
+        def log_message(self, *args):
+            pass
 
-month_options = sorted(month_targets.keys(), key=lambda m: pd.to_datetime(m, format="%b-%Y"))
-default_index = len(month_options)-1
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), ApiHandler)
+    except OSError as e:
+        print(f"KPI API not started on port {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="dashboard-api", daemon=True).start()
+    return server
+
+# Dashboard grid component - stays mounted, receives JSON deltas and acks the version it has applied
+dashboard_grid = components.declare_component("dashboard_grid", path=str(APP_DIR / "components" / "dashboard_grid"))
+PLOTLY_SRC = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+# Sessions remember a digest per KPI/chart rather than the objects, so evicted renders are actually freed
+def grid_digest(v):
+    return hashlib.sha1(json.dumps(v, sort_keys=True, default=str).encode()).hexdigest()
+
+def send_grid_state(state, revision):
+    items = {("values", k): v for k, v in state["values"].items()}
+    items.update({("charts", k): v for k, v in state["charts"].items()})
+    flat = {key: grid_digest(v) for key, v in items.items()}
+    sent = st.session_state.setdefault("grid_sent", {})
+    version = st.session_state.get("grid_version", 0)
+    if version == 0 or sent.get(version) != flat:
+        version += 1
+        sent[version] = flat
+    # Diff against whatever the component acked; unknown/0 means a fresh iframe, so send everything
+    grid_value = st.session_state.get("dashboard_grid")
+    acked = grid_value.get("version", 0) if isinstance(grid_value, dict) else (grid_value or 0)
+    base = acked if acked in sent else 0
+    base_flat = sent.get(base, {})
+    delta = {"values": {}, "charts": {}}
+    for (kind, k), digest in flat.items():
+        if base_flat.get((kind, k)) != digest:
+            delta[kind][k] = items[(kind, k)]
+    for v in [v for v in sent if v not in (version, acked)]:
+        del sent[v]
+    st.session_state["grid_version"] = version
+    return dashboard_grid(version=version, base=base, delta=delta, revision=revision, plotly_src=PLOTLY_SRC,
+                          key="dashboard_grid", default=0)
+
+# Drill-down for the last clicked day, read straight from the snapshot's day index
+DRILL_TITLES = {"sale": "Sale Trend (with kus)", "sale_wokus": "Sale Trend (w/o kus)", "rej": "Rejection Trend"}
+
+def render_drilldown(data, grid_value):
+    click = grid_value.get("click") if isinstance(grid_value, dict) else None
+    if not click or click.get("seq") == st.session_state.get("drill_closed_seq"):
+        return
+    day = pd.to_datetime(click["x"], errors="coerce")
+    if pd.isna(day):
+        return
+    rows = drill_rows(data, click["chart"], day)
+    st.markdown(f"**Sales Report rows for {day:%d-%b-%Y}** - {DRILL_TITLES.get(click['chart'], click['chart'])}")
+    st.dataframe(rows, hide_index=True)
+    st.button("Close drill-down", key="drill_close",
+              on_click=lambda: st.session_state.update(drill_closed_seq=click.get("seq")))
 
 # Function to render dashboard
-def render_dashboard(selected_month):
-    selected_month_dt = pd.to_datetime(selected_month, format="%b-%Y")
-    month_num = selected_month_dt.month
-    year_num = selected_month_dt.year
-
-    # Filter data for the selected month
-    df_filtered = df[(df[date_col].dt.month==month_num) & (df[date_col].dt.year==year_num)]
-    sale_filtered = sale_df[(sale_df["date"].dt.month==month_num) & (sale_df["date"].dt.year==year_num)]
-    rej_filtered = rej_df[(rej_df["date"].dt.month==month_num) & (rej_df["date"].dt.year==year_num)]
-    wokus_sale_filtered = wokus_sale_df[(wokus_sale_df["date"].dt.month==month_num) & (wokus_sale_df["date"].dt.year==year_num)] if not wokus_sale_df.empty else pd.DataFrame()
-
-    if not df_filtered.empty:
-        latest = df_filtered.iloc[-1]
-        today_sale = latest[today_col]
-        oee = ensure_pct(latest[oee_col])
-        rej_day_amount = latest[rej_day_col]
-        rej_pct = ensure_pct(latest[rej_pct_col])
-        rej_cum_val = df_filtered[rej_cum_col].dropna().iloc[-1] if not df_filtered[rej_cum_col].dropna().empty else 0
-        total_cum_val = df_filtered[total_cum_col].dropna().iloc[-1] if not df_filtered[total_cum_col].dropna().empty else 0
-        copq_display = format_inr(latest[copq_col]) if copq_col and pd.notna(latest[copq_col]) else "..."
-        copq_cum_display = format_inr(latest[copq_cum_col]) if copq_cum_col and pd.notna(latest[copq_cum_col]) else "..."
-    else:
-        today_sale=oee=rej_day_amount=rej_pct=rej_cum_val=total_cum_val=0
-        copq_display=copq_cum_display="..."
-
-    total_sales_filtered = sale_filtered["sale amount"].sum() if not sale_filtered.empty else 0
-    target_sale = month_targets.get(selected_month, 1)
-    if target_sale <= 0:
-        target_sale = 1
-    achieved_pct_val = round(total_sales_filtered / target_sale * 100, 2)
-
-    # Sale Trend Graph WITH KUS
-    num_colors = max(len(sale_filtered), 2)
-    bar_gradients = pc.n_colors("rgb(34,139,230)", "rgb(79,223,253)", num_colors, colortype="rgb")
-    fig_sale = go.Figure()
-    fig_sale.add_trace(go.Bar(
-        x=sale_filtered["date"],
-        y=sale_filtered["sale amount"]/100000.0,
-        marker_color=bar_gradients,
-        marker_line_width=0,
-        opacity=0.97,
-        name="With KUS",
-        hovertemplate="Date: %{x|%d-%b}<br>Sale: %{y:.2f} Lakh<extra></extra>"
-    ))
-    fig_sale.update_layout(
-        margin=dict(t=5,b=30,l=10,r=10),
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        height=105,
-        xaxis=dict(showgrid=False, tickfont=dict(size=10), tickangle=-45, automargin=True, tickformat="%d", dtick="D1"),
-        yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="Lakh")
-    )
-
-    # Sale Trend Graph W/O KUS (exactly same style)
-    fig_sale_wokus = go.Figure()
-    if not wokus_sale_filtered.empty:
-        num_colors_wokus = max(len(wokus_sale_filtered), 2)
-        bar_gradients_wokus = pc.n_colors("rgb(255,107,107)", "rgb(255,200,200)", num_colors_wokus, colortype="rgb")
-        fig_sale_wokus.add_trace(go.Bar(
-            x=wokus_sale_filtered["date"],
-            y=wokus_sale_filtered["sale amount"]/100000.0,
-            marker_color=bar_gradients_wokus,
-            marker_line_width=0,
-            opacity=0.97,
-            name="W/O KUS",
-            hovertemplate="Date: %{x|%d-%b}<br>Sale: %{y:.2f} Lakh<extra></extra>"
-        ))
-        fig_sale_wokus.update_layout(
-            margin=dict(t=5,b=30,l=10,r=10),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            height=105,
-            xaxis=dict(showgrid=False, tickfont=dict(size=10), tickangle=-45, automargin=True, tickformat="%d", dtick="D1"),
-            yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="Lakh")
-        )
-    else:
-        fig_sale_wokus.update_layout(
-            margin=dict(t=5,b=30,l=10,r=10),
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            height=105,
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=False)
-        )
-
-    # Rejection Trend Graph
-    rej_lakh = rej_filtered["rej amt"]/1000.0
-    fig_rej = go.Figure()
-    fig_rej.add_trace(go.Scatter(
-        x=rej_filtered["date"],
-        y=rej_lakh,
-        mode="lines+markers",
-        marker=dict(size=8, color="#fc7d1b", line=dict(width=1.5, color="#fff")),
-        line=dict(width=5, color="#fc7d1b", shape="spline"),
-        hoverinfo="x+y",
-        opacity=1,
-        hovertemplate="Date: %{x|%d-%b}<br>Rejection: %{y:.2f} K<extra></extra>"
-    ))
-    fig_rej.add_trace(go.Scatter(
-        x=rej_filtered["date"],
-        y=rej_lakh,
-        mode="lines",
-        line=dict(width=15, color="rgba(252,125,27,0.13)", shape="spline"),
-        hoverinfo="skip",
-        opacity=1
-    ))
-    fig_rej.update_layout(
-        margin=dict(t=5,b=30,l=10,r=10),
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        height=105,
-        showlegend=False,
-        xaxis=dict(showgrid=False, tickfont=dict(size=10), tickangle=-45, automargin=True, tickformat="%d", dtick="D1"),
-        yaxis=dict(showgrid=False, tickfont=dict(size=10), automargin=True, title="K")
-    )
-
-    sale_html = fig_sale.to_html(include_plotlyjs="cdn", full_html=False)
-    sale_wokus_html = fig_sale_wokus.to_html(include_plotlyjs="cdn", full_html=False)
-    rej_html = fig_rej.to_html(include_plotlyjs="cdn", full_html=False)
-
-    # Speedometer Gauge
-    GREEN="#009e4f"
-    gauge = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=achieved_pct_val,
-        number={"suffix":"%", "font":{"size":36, "color":GREEN, "family":"Poppins","weight":"bold"}},
-        domain={"x":[0,1],"y":[0,1]},
-        gauge={
-            "shape":"angular",
-            "axis":{"range":[0,100],"tickvals":[0,25,50,75,100],"ticktext":["0%","25%","50%","75%","100%"]},
-            "bar":{"color":GREEN, "thickness":0.35},
-            "bgcolor":"rgba(0,0,0,0)",
-            "steps":[{"range":[0,60],"color":"#c4eed1"},{"range":[60,85],"color":"#7ee2b7"},{"range":[85,100],"color":GREEN}],
-            "threshold":{"line":{"color":"#111","width":4},"value":achieved_pct_val}
-        }
-    ))
-    gauge.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", margin=dict(t=5,b=5,l=5,r=5), height=130)
-    gauge_html = gauge.to_html(include_plotlyjs="cdn", full_html=False)
-
-    # Dashboard values
-    bg_b64 = load_image_base64(IMAGE_PATH)
-    top_today_sale = format_inr(today_sale)
-    top_oee = f"{round(oee if pd.notna(oee) else 0,1)}%"
-    left_rej_amt = format_inr(rej_day_amount)
-    left_rej_pct = f"{rej_pct:.1f}%"
-    bottom_rej_cum = format_inr(rej_cum_val)
-    total_cum_disp = format_inr(total_cum_val)
-    inventory_val = dash_ws.acell("K2").value
-    inventory_disp = format_inr(inventory_val) if inventory_val else "0"
-    
-    yesterday_sale_wokus = dash_ws.acell("L2").value
-    yesterday_sale_wokus_disp = format_inr(yesterday_sale_wokus) if yesterday_sale_wokus else "0"
-    cum_sale_wokus = dash_ws.acell("M2").value
-    cum_sale_wokus_disp = format_inr(cum_sale_wokus) if cum_sale_wokus else "0"
-    
-    # Render dashboard html - **FIXED: Rejection % back, Rejection Cumulative in BLANK card (row 4, col 3)**
+def render_dashboard(plant_id, data, selected_month, span_months):
+    # Render dashboard - card grid lives in components/dashboard_grid, only changed values/charts are sent
     st.markdown(
         f"""
     <style>
@@ -342,84 +368,201 @@ def render_dashboard(selected_month):
         padding: 0 !important;
         margin: 0 !important;
     }}
+    {background_css(build_background_variants(BG_STATIC_DIR, "app/static/bg/"), bg_theme)}
     </style>
     """,
         unsafe_allow_html=True,
     )
 
-    html_template = f"""
-    <!doctype html>
-    <html><head><meta charset="utf-8"><link href="https://fonts.googleapis.com/css2?family=Fredoka:wght@400;600;700;900&display=swap" rel="stylesheet"><style>
-    :root {{
-        --blue1: #8ad1ff; --blue2: #4ca0ff; --blue3: #0d6efd;
-        --orange1: #ffd699; --orange2: #ff9334; --orange3: #ff6a00;
-        --green1: #a6ffd9; --green2: #00d97e;
-    }}
-    body {{margin:0;padding:0;font-family:"Fredoka",sans-serif;background:none!important;}}
-    .container {{
-        box-sizing:border-box;width:100%;height:100vh;padding:40px 40px 0 40px!important;
-        display:grid;grid-template-columns:1fr 1fr 1fr 1fr;grid-template-rows:130px 130px 140px 140px;
-        gap:20px;max-width:2200px;max-height:900px;margin:auto;
-    }}
-    .card {{
-        position:relative;border-radius:20px;padding:0;display:flex;flex-direction:column;
-        justify-content:center;align-items:center;backdrop-filter:blur(12px) saturate(180%);
-        background:rgba(255,255,255,0.08);border:1px solid rgba(255,255,255,0.15);
-        box-shadow:0 0 15px rgba(255,255,255,0.28),0 10px 30px rgba(0,0,0,0.5),inset 0 0 20px rgba(255,255,255,0.12);
-        overflow:hidden;
-    }}
-    .value-blue {{font-size:36px!important;font-weight:900;background:linear-gradient(180deg,var(--blue1),var(--blue2),var(--blue3));
-        -webkit-background-clip:text;-webkit-text-fill-color:transparent;}}
-    .value-orange {{font-size:36px!important;font-weight:900;background:linear-gradient(180deg,var(--orange1),var(--orange2),var(--orange3));
-        -webkit-background-clip:text;-webkit-text-fill-color:transparent;}}
-    .value-green {{font-size:36px!important;font-weight:900;background:linear-gradient(180deg,var(--green1),var(--green2));
-        -webkit-background-clip:text;-webkit-text-fill-color:transparent;}}
-    .title-black {{color:#5c5c63!important;font-size:14px;font-weight:800;margin-top:6px;text-align:center;}}
-    .chart-title-black {{position:absolute;top:8px;left:12px;color:#fff!important;font-size:14px;font-weight:700;z-index:10;}}
-    .chart-container {{width:100%;height:100%;display:block;padding:20px 5px 5px 5px;box-sizing:border-box;}}
-    .snow-bg {{position:absolute;left:0;top:0;width:100%;height:100%;opacity:0.5;pointer-events:none;}}
-    .center-content {{display:flex;flex-direction:column;align-items:center;width:100%;z-index:5;}}
-    .gauge-wrapper {{width:100%;height:100%;display:flex;align-items:center;justify-content:center;overflow:hidden;}}
-    </style></head><body><div class="container">
-    
-    <div class="card"><canvas class="snow-bg" id="snowsale"></canvas><div class="center-content">
-        <div class="value-blue">₹ {top_today_sale}</div><div class="title-black">Yesterday's Sale (with kus)</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowyesterdaywokus"></canvas><div class="center-content">
-        <div class="value-blue">₹ {yesterday_sale_wokus_disp}</div><div class="title-black">Yesterday's Sale (w/o kus)</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowrej"></canvas><div class="center-content">
-        <div class="value-orange">₹ {left_rej_amt}</div><div class="title-black">Rejection Amount</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowoee"></canvas><div class="center-content">
-        <div class="value-blue">{top_oee}</div><div class="title-black">OEE %</div></div></div>
-        
-    <div class="card"><canvas class="snow-bg" id="snowcumsale"></canvas><div class="center-content">
-        <div class="value-blue">₹ {total_cum_disp}</div><div class="title-black">Cumulative Sale (with kus)</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowcumwokus"></canvas><div class="center-content">
-        <div class="value-blue">₹ {cum_sale_wokus_disp}</div><div class="title-black">Cumulative Sale (w/o kus)</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowach"></canvas><div class="center-content">
-        <div class="value-orange">{left_rej_pct}</div><div class="title-black">Rejection %</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowcopq"></canvas><div class="center-content">
-        <div class="value-blue">₹ {copq_display}</div><div class="title-black">COPQ</div></div></div>
-        
-    <div class="card"><canvas class="snow-bg" id="snowsalechart"></canvas><div class="chart-title-black">Sale Trend (with kus)</div><div class="chart-container">{sale_html}</div></div>
-    <div class="card"><canvas class="snow-bg" id="snowsalewokus"></canvas><div class="chart-title-black">Sale Trend (w/o kus)</div><div class="chart-container">{sale_wokus_html}</div></div>
-    <div class="card"><canvas class="snow-bg" id="snowrejchart"></canvas><div class="chart-title-black">Rejection Trend</div><div class="chart-container">{rej_html}</div></div>
-    <div class="card"><canvas class="snow-bg" id="snowcopqcum"></canvas><div class="center-content">
-        <div class="value-blue">₹ {copq_cum_display}</div><div class="title-black">COPQ Cumulative</div></div></div>
-        
-    <div class="card"><canvas class="snow-bg" id="snowspeed"></canvas><div class="gauge-wrapper">{gauge_html}</div></div>
-    <div class="card"><canvas class="snow-bg" id="snowinventory"></canvas><div class="center-content">
-        <div class="value-blue">₹ {inventory_disp}</div><div class="title-black">Inventory Value</div></div></div>
-    <div class="card"><canvas class="snow-bg" id="snowrejcum"></canvas><div class="center-content">
-        <div class="value-orange">₹ {bottom_rej_cum}</div><div class="title-black">Rejection Cumulative</div></div></div>
-    <div class="card"></div>
-    
-    </body></html>
-    """
-    st.components.v1.html(html_template, height=900, scrolling=True)
+    # Zoomed x windows come back from the component; each is re-downsampled from the full series.
+    # Windows drawn on another month/span are stale and ignored.
+    revision = trend_revision(selected_month, span_months)
+    grid_value = st.session_state.get("dashboard_grid")
+    zoom = grid_value.get("zoom") if isinstance(grid_value, dict) else None
+    zoom = (zoom.get("windows") or {}) if isinstance(zoom, dict) and zoom.get("revision") == revision else {}
+    # Same plant, data version, month, span and zoom as a recent render in any session - reuse its state,
+    # the component sees no delta when it is the one it already holds
+    render_key = (plant_id, data.version, selected_month, span_months, json.dumps(zoom, sort_keys=True))
+    state = RENDERS.get(render_key)
+    if state is None:
+        state = build_grid_state(data, selected_month, span_months, zoom)
+        RENDERS.put(render_key, state)
+        MEMORY.check(RENDERS)
+    sent_version = st.session_state.get("grid_version")
+    with STAGES.stage("grid:send"):
+        grid_value = send_grid_state(state, revision)
+    if st.session_state["grid_version"] != sent_version:
+        MEMORY.note_session(session_origin(), plant_id, st.session_state["grid_sent"])
+    # The iframe reports how long its last apply took; each version is counted once
+    apply = grid_value.get("apply") if isinstance(grid_value, dict) else None
+    if apply and apply.get("version") != st.session_state.get("grid_apply_timed"):
+        st.session_state["grid_apply_timed"] = apply.get("version")
+        STAGES.record("iframe:apply", apply.get("ms", 0) / 1000)
+    render_drilldown(data, grid_value)
+
+# Wall-display mode (?kiosk=1&refresh=<seconds>) - only this fragment re-executes on the timer
+def dashboard_main():
+    plants = load_plants()
+    plant_ids = list(plants)
+    if len(plant_ids) > 1:
+        default_plant = st.query_params.get("plant", plant_ids[0])
+        plant_id = st.selectbox("Plant", plant_ids, index=plant_ids.index(default_plant) if default_plant in plant_ids else 0,
+                                format_func=lambda pid: plants[pid]["name"], key="plant_id")
+    else:
+        plant_id = plant_ids[0]
+    clock = STAGES.clock("script")
+    try:
+        data = load_data(plant_id)
+    except DataLoadError as e:
+        st.error(str(e))
+        return
+    clock.lap("load_data")
+    month_options = sorted(data.month_targets.keys(), key=lambda m: pd.to_datetime(m, format="%b-%Y"))
+    default_index = len(month_options)-1
+    # Bottom month selector - lives in the fragment so picking a month reruns only the dashboard
+    selected_month = st.selectbox("Select Month to View Data for", month_options, index=default_index, key="selected_month")
+    span_months = st.selectbox("Trend span (months)", TREND_SPANS, key="trend_span")
+    render_dashboard(plant_id, data, selected_month, span_months)
+    clock.lap("render_dashboard")
+    # Quarter / fiscal-year / YoY comparison - slices of the monthly KPI table cached on the snapshot
+    comparison = st.radio("Compare", COMPARISONS, horizontal=True, key="comparison")
+    if comparison != "Month":
+        view = comparison_view(data, comparison, selected_month)
+        st.dataframe(view.style.format("{:,.1f}", na_rep="-"), width="stretch")
+    if not kiosk:
+        render_exports(plant_id, data)
+    clock.lap("tables")
+    if show_timing:
+        render_timing_overlay()
+
+# Stage timing overlay (?timing=1) - last / p50 / p95 per stage over the rolling window, all sessions
+def render_timing_overlay():
+    rows = "".join(f"<tr><td>{name}</td><td>{v['n']}</td><td>{v['last_ms']:.1f}</td><td>{v['p50_ms']:.1f}</td>"
+                   f"<td>{v['p95_ms']:.1f}</td></tr>" for name, v in STAGES.summary().items())
+    st.markdown(
+        f"""
+    <div style="position:fixed;top:8px;right:8px;z-index:1000;background:rgba(0,0,0,0.78);color:#fff;
+                font:11px/1.35 monospace;padding:6px 8px;border-radius:6px;max-height:80vh;overflow:auto;">
+    <table><tr><th align="left">stage</th><th>n</th><th>last ms</th><th>p50</th><th>p95</th></tr>{rows}</table>
+    </div>
+    """,
+        unsafe_allow_html=True,
+    )
 
-# Bottom month selector
-selected_month = st.selectbox("Select Month to View Data for", month_options, index=default_index)
-render_dashboard(selected_month)
+# Month-range downloads of the parsed frames - bytes are built from the snapshot only when clicked
+EXPORT_MIME = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+def render_exports(plant_id, data):
+    months = export_months(data)
+    if not months:
+        return
+    with st.expander("Export data"):
+        start_month, end_month = st.select_slider("Months", months, value=(months[0], months[-1]), key="export_range")
+        dataset = st.selectbox("Dataset", list(EXPORT_DATASETS), key="export_dataset")
+        frame = export_frame(data, dataset, start_month, end_month)
+        auto_fmt = export_format(frame)
+        fmt = st.radio("Format", ["csv", "parquet"], index=["csv", "parquet"].index(auto_fmt), horizontal=True,
+                       format_func=lambda f: f"{f.upper()}{' (recommended)' if f == auto_fmt else ''}", key=f"export_fmt_{auto_fmt}")
+        file_name = f"{plant_id}_{dataset.lower().replace(' ', '_').replace('/', '')}_{start_month}_{end_month}.{fmt}"
+        st.download_button(f"Download {len(frame):,} rows", lambda: export_bytes(frame, fmt), file_name=file_name,
+                           mime=EXPORT_MIME[fmt], on_click="ignore", disabled=frame.empty, key="export_download")
+
+# Admin page (?admin=quota) - Sheets API calls per minute against the quota, cache hit ratio and a
+# per method / range / origin breakdown, from the local store every process writes to
+QUOTA_WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400}
+
+def render_quota_page():
+    st.title("Sheets API usage")
+    window = st.selectbox("Window", list(QUOTA_WINDOWS), key="quota_window")
+    since = time.time() - QUOTA_WINDOWS[window]
+    calls, hits = API_CALLS.calls(since), API_CALLS.hits(since)
+    minutes = per_minute(calls, hits, since)
+    ratio = hit_ratio(calls, hits)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Calls this minute", f"{minutes['calls'].iloc[-1]} / {SHEETS_READ_QUOTA_PER_MIN}")
+    c2.metric("Peak calls / minute", int(minutes["calls"].max()))
+    c3.metric("Cache hit ratio", f"{ratio:.1%}" if ratio is not None else "-")
+    c4.metric("Failed calls", int(calls["error"].notna().sum()))
+
+    # Longer windows show the busiest minute of each hour, which is what runs into the quota
+    series = minutes if QUOTA_WINDOWS[window] <= 3600 else minutes.resample("h").max()
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=series.index, y=series["calls"], name="Sheets calls / min", marker_color="rgb(34,139,230)"))
+    fig.add_trace(go.Bar(x=series.index, y=series["errors"], name="Failed", marker_color="#ff2d2d"))
+    fig.add_hline(y=SHEETS_READ_QUOTA_PER_MIN, line_dash="dash", line_color="#fc7d1b", annotation_text="quota")
+    fig.update_layout(barmode="overlay", height=300, margin=dict(t=10, b=30, l=10, r=10), legend=dict(orientation="h"))
+    st.plotly_chart(fig, key="quota_chart")
+
+    st.subheader("Calls by method, range and origin")
+    st.dataframe(call_breakdown(calls), hide_index=True)
+    failed = calls[calls["error"].notna()]
+    if not failed.empty:
+        st.subheader("Recent failures")
+        st.dataframe(failed.tail(20).assign(ts=lambda f: pd.to_datetime(f["ts"], unit="s")), hide_index=True)
+
+# Admin page (?admin=memory) - what each snapshot, session and cached render holds; allocation sites and
+# the process total need DASHBOARD_MEMORY_PROFILE=1 (tracemalloc)
+def render_memory_page():
+    st.title("Memory")
+    tracing = tracemalloc.is_tracing()
+    used, peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Traced now", f"{used / 2**20:.1f} MB" if tracing else "off")
+    c2.metric("Traced peak", f"{peak / 2**20:.1f} MB" if tracing else "off")
+    c3.metric("Limit", f"{MEMORY_LIMIT_MB} MB" if MEMORY_LIMIT_MB else "none")
+    c4.metric("Cached renders", f"{len(RENDERS.entries)} / {RENDERS.total() / 2**20:.1f} MB")
+    if not MEMORY_PROFILE:
+        st.info("Set DASHBOARD_MEMORY_PROFILE=1 to trace allocations and size snapshots and sessions.")
+    for at, message in reversed(MEMORY.alerts):
+        st.warning(f"{time.strftime('%d-%b %H:%M:%S', time.localtime(at))} - {message}")
+
+    st.subheader("Snapshots (MB)")
+    snapshots = pd.DataFrame.from_dict(MEMORY.snapshots, orient="index")
+    if not snapshots.empty:
+        size_cols = snapshots.columns.difference(["version", "loaded_at"])
+        snapshots[size_cols] = snapshots[size_cols] / 2**20
+        snapshots["total"] = snapshots[size_cols].sum(axis=1)
+        snapshots["loaded_at"] = pd.to_datetime(snapshots["loaded_at"], unit="s")
+    st.dataframe(snapshots)
+    st.subheader("Sessions")
+    sessions = pd.DataFrame.from_dict(MEMORY.sessions, orient="index")
+    if not sessions.empty:
+        sessions["sent"] = sessions["sent"] / 1024
+        sessions = sessions.rename(columns={"sent": "sent_kb"}).assign(last_seen=lambda f: pd.to_datetime(f["last_seen"], unit="s"))
+    st.dataframe(sessions)
+    st.subheader("Cached renders")
+    st.dataframe(pd.DataFrame(RENDERS.rows()), hide_index=True)
+    if tracing:
+        st.subheader("Top allocation sites")
+        st.dataframe(pd.DataFrame(MEMORY.top_allocations()), hide_index=True)
+
+# Background theme (?theme=nature)
+bg_theme = st.query_params.get("theme", DEFAULT_THEME)
+kiosk = st.query_params.get("kiosk", "0").lower() in ("1", "true", "yes")
+show_timing = st.query_params.get("timing", "0").lower() in ("1", "true", "yes")
+try:
+    refresh_s = max(int(st.query_params.get("refresh", KIOSK_REFRESH_S)), 10)
+except ValueError:
+    refresh_s = KIOSK_REFRESH_S
+# With the webhook on, every session ticks every few seconds - a tick only looks at the latest snapshot
+if WEBHOOK_PORT:
+    start_webhook_server(WEBHOOK_PORT, WEBHOOK_TOKEN)
+    run_every = min(refresh_s, PUSH_CHECK_S) if kiosk else PUSH_CHECK_S
+else:
+    run_every = refresh_s if kiosk else None
+# Process-wide and started once (cache_resource); the first session to get here brings them up
+MEMORY.start()
+start_all_refreshers()
+if API_PORT:
+    start_api_server(API_PORT, API_TOKEN)
+admin = st.query_params.get("admin")
+if admin == "quota":
+    render_quota_page()
+elif admin == "memory":
+    render_memory_page()
+else:
+    st.fragment(dashboard_main, run_every=run_every)()
 
 
 #####################################the below code is working till feb2026
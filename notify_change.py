@@ -0,0 +1,20 @@
+# Local stand-in for the Apps Script onEdit trigger - tells the dashboard the sheet changed
+import argparse
+import json
+import urllib.request
+
+parser = argparse.ArgumentParser(description="Notify the dashboard that the spreadsheet changed")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8502)
+parser.add_argument("--token", default="")
+parser.add_argument("--sheet", default="Dashboard")
+args = parser.parse_args()
+
+req = urllib.request.Request(
+    f"http://{args.host}:{args.port}/notify",
+    data=json.dumps({"sheet": args.sheet}).encode(),
+    headers={"Content-Type": "application/json", "X-Dashboard-Token": args.token},
+    method="POST",
+)
+with urllib.request.urlopen(req, timeout=10) as resp:
+    print(resp.status, resp.read().decode())
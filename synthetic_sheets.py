@@ -0,0 +1,134 @@
+# Synthetic Dashboard / Sales Report sheets in the live layout, plus an in-memory stand-in for gspread
+# worksheets, so parsing and rendering can be exercised (and benchmarked) without touching Google.
+#   Dashboard:    C Date, D-J daily KPIs (percentages as fractions), K Inventory (K2), L-M COPQ, targets in A11:B14
+#   Sales Report: A-C date/sales type/amount (with KUS), K-L rejection date/amount, Q/S date/amount (W/O KUS)
+#   python synthetic_sheets.py --months 120 --plant main --out synthetic   (writes <plant>_<sheet>.json)
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dashboard_data import DASHBOARD_SHEET, SALES_REPORT_SHEET
+
+DASHBOARD_HEADER = ["Target Month", "Target", "Date", "Today's Sale", "OEE %", "Plan vs Actual %",
+                    "Rejection Amount (DayBefore)", "Rejection %", "Rejection Amount (Cumulative)",
+                    "Total Sales (Cumulative)", "Inventory", "COPQ", "COPQ Cumulative"]
+SALES_REPORT_WIDTH = 19
+SALES_TYPES = {"OEE": 0.78, "JOB WORK": 0.12, "SCRAP": 0.04, "TRADING": 0.06}
+TARGET_ROWS = 4  # A11:B14, dashboard_data.TARGET_ROWS
+DATE_FORMAT = "%d-%b-%Y"
+
+def sheet_number(v):
+    return f"{v:,.0f}"
+
+def generate_plant(months, seed=0, end=None, daily_sale=600000):
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or pd.Timestamp.today()).normalize()
+    start = (end - pd.DateOffset(months=months - 1)).replace(day=1)
+    days = pd.date_range(start, end, freq="D")
+    working = days.dayofweek < 6  # Sundays off
+
+    # Daily totals - slow growth, a yearly cycle and noise; nothing is booked on Sundays
+    t = np.arange(len(days)) / 365.0
+    level = daily_sale * (1 + 0.08 * t) * (1 + 0.15 * np.sin(2 * np.pi * (t + 0.25)))
+    sale = np.where(working, level * rng.lognormal(0, 0.25, len(days)), 0).round()
+    oee = np.clip(rng.normal(0.78, 0.06, len(days)), 0.4, 0.97)
+    rej_pct = np.clip(rng.gamma(2.0, 0.6, len(days)), 0.1, 8.0)
+    spikes = rng.random(len(days)) < 0.02
+    rej_pct[spikes] *= 4
+    rej = np.where(working, sale * rej_pct / 100, 0).round()
+    copq = (rej * rng.uniform(1.1, 1.6, len(days))).round()
+
+    month = days.to_period("M")
+    frame = pd.DataFrame({"sale": sale, "rej": rej, "copq": copq}, index=days)
+    cum = frame.groupby(month).cumsum()
+
+    targets = (frame["sale"].groupby(month).sum() * rng.uniform(0.95, 1.1)).round(-5).tail(TARGET_ROWS)
+
+    dashboard = [DASHBOARD_HEADER]
+    for i, day in enumerate(days):
+        dashboard.append([
+            "", "", day.strftime(DATE_FORMAT), sheet_number(sale[i]), f"{oee[i]:.3f}", f"{rng.uniform(0.85, 1.05):.3f}",
+            sheet_number(rej[i]), f"{rej_pct[i] / 100:.4f}", sheet_number(cum["rej"].iloc[i]), sheet_number(cum["sale"].iloc[i]),
+            "", sheet_number(copq[i]), sheet_number(cum["copq"].iloc[i]),
+        ])
+    dashboard[1][10] = sheet_number(rng.uniform(20, 60) * daily_sale)
+    for row, (period, target) in zip(dashboard[10:10 + TARGET_ROWS], targets.items()):
+        row[0], row[1] = period.strftime("%b-%Y"), sheet_number(target)
+
+    # Sales Report - the three blocks are independent lists side by side, each padded to the longest
+    kus_rows, rej_rows, wokus_rows = [], [], []
+    shares = np.array(list(SALES_TYPES.values()))
+    for i, day in enumerate(days):
+        if not working[i]:
+            continue
+        ds = day.strftime(DATE_FORMAT)
+        split = sale[i] * rng.dirichlet(shares * 50)
+        kus_rows.extend([ds, sales_type, sheet_number(amount)] for sales_type, amount in zip(SALES_TYPES, split))
+        rej_rows.append([ds, sheet_number(rej[i])])
+        wokus_rows.append([ds, sheet_number(sale[i] * rng.uniform(0.45, 0.6))])
+    header = [""] * SALES_REPORT_WIDTH
+    header[0:3], header[10:12], header[16], header[18] = ["Date", "Sales Type", "Sale Amount"], ["Date", "Rejection Amount"], "Date", "Sale Amount"
+    sales_report = [header]
+    for i in range(max(len(kus_rows), len(rej_rows), len(wokus_rows))):
+        row = [""] * SALES_REPORT_WIDTH
+        if i < len(kus_rows):
+            row[0:3] = kus_rows[i]
+        if i < len(rej_rows):
+            row[10:12] = rej_rows[i]
+        if i < len(wokus_rows):
+            row[16], row[18] = wokus_rows[i]
+        sales_report.append(row)
+    return {DASHBOARD_SHEET: dashboard, SALES_REPORT_SHEET: sales_report}
+
+# In-memory worksheet answering the reads the dashboard and backfill make: whole sheet, "A11:B14"-style
+# ranges and "start:end" row ranges. latency_s (+ per_1k_rows_s per 1000 rows returned) mimics the Sheets round trip.
+# Reads are still recorded by dashboard_quota, so callers point API_CALLS at ":memory:" first.
+class FakeWorksheet:
+    def __init__(self, rows, title, spreadsheet_id, latency_s=0.0, per_1k_rows_s=0.0):
+        self.rows, self.title, self.spreadsheet_id = rows, title, spreadsheet_id
+        self.latency_s, self.per_1k_rows_s = latency_s, per_1k_rows_s
+        self.row_count = len(rows)
+        self.calls = 0
+
+    def get_values(self, range_name=None, **kwargs):
+        self.calls += 1
+        if not range_name:
+            values = self.rows
+        else:
+            start, _, end = range_name.partition(":")
+            if start.isdigit():
+                values = self.rows[int(start) - 1:int(end)]
+            else:
+                (r0, c0), (r1, c1) = (a1_cell(start), a1_cell(end or start))
+                values = [row[c0:c1 + 1] for row in self.rows[r0:r1 + 1]]
+        time.sleep(self.latency_s + self.per_1k_rows_s * len(values) / 1000)
+        return [list(row) for row in values]
+
+def a1_cell(label):
+    letters = "".join(ch for ch in label if ch.isalpha())
+    col = 0
+    for ch in letters.upper():
+        col = col * 26 + ord(ch) - ord("A") + 1
+    return int(label[len(letters):]) - 1, col - 1
+
+def fake_worksheets(sheets, spreadsheet_id, latency_s=0.0, per_1k_rows_s=0.0):
+    return {name: FakeWorksheet(rows, name, spreadsheet_id, latency_s, per_1k_rows_s) for name, rows in sheets.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Dashboard / Sales Report sheets as JSON rows")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--plant", action="append", help="plant id (repeat for several, default: main)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("synthetic"))
+    args = parser.parse_args()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    for i, plant_id in enumerate(args.plant or ["main"]):
+        for name, rows in generate_plant(args.months, seed=args.seed + i).items():
+            path = args.out / f"{plant_id}_{name.lower().replace(' ', '_')}.json"
+            path.write_text(json.dumps(rows))
+            print(f"{plant_id}: {name} {len(rows) - 1} rows -> {path}")